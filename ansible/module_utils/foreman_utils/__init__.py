@@ -0,0 +1,67 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Helpers shared by the foreman modules and plugins.
+
+The names used by the modules are imported from here. python-foreman,
+requests, retrying and multiprocessing are only imported when a client is
+built or a pool of threads is needed, so a module failing on its
+arguments, or not talking to foreman at all, doesn't pay for them.
+"""
+
+from ansible.module_utils.foreman_utils.caches import (ApiVersionCache,
+                                                       LookupCache,
+                                                       ResponseCache,
+                                                       lookup_cache)
+from ansible.module_utils.foreman_utils.client import (
+    API_VERSION, LazyForeman, build_foreman_client, connection_stats,
+    get_foreman_client, has_foreman_client)
+from ansible.module_utils.foreman_utils.common import (
+    DEFAULT_CACHE_DIR, IDEMPOTENT_METHODS, MISSING_ID_ERRORS,
+    MISSING_ID_FIELD_ERRORS, RETRY_STATUSES, UNCACHED_RESOURCES,
+    ForemanMoreThanExpectedElements, ForemanNotFoundElement, ModuleExit,
+    ensure_dir, error_message, error_status, is_not_found_error,
+    is_transient_error, string_types, write_json)
+from ansible.module_utils.foreman_utils.hosts import (
+    HOST_REFERENCES, INTERFACE_TYPES, POWER_STATES, UPDATABLE_HOST_ARGS,
+    apply_power_action, check_host_state, create_host, delete_host,
+    ensure_host, exit_host_facts, exit_hostvars, get_host_state, host_args,
+    host_facts, host_status, journaled_references, power_action,
+    power_state, skip_journaled_host, update_host)
+from ansible.module_utils.foreman_utils.journal import (OperationJournal,
+                                                        operation_journal)
+from ansible.module_utils.foreman_utils.metrics import (CallMetrics,
+                                                        record_cache)
+from ansible.module_utils.foreman_utils.plugin import (BOOLEANS_FALSE,
+                                                       BOOLEANS_TRUE,
+                                                       PluginModule)
+from ansible.module_utils.foreman_utils.search import (
+    BATCH_SIZE, INDEXED_RESOURCES, PAGE_SIZE, SUBNET_FIELDS,
+    UNINDEXED_RESOURCES, SubnetIndex, count_elements, elements_from_name,
+    elements_from_names, id_from_name, ids_from_names,
+    invalidate_served_lookups, invalidate_subnet_index, lookup_ids,
+    pages_after_id, project_fields, search_elements, single_element_from_name,
+    subnet_from_ip, subnet_from_network, subnet_index)
+from ansible.module_utils.foreman_utils.spec import (foreman_argument_spec,
+                                                     host_argument_spec,
+                                                     host_facts_argument_spec,
+                                                     host_power_argument_spec)
+from ansible.module_utils.foreman_utils.tasks import (LOOKUP_WORKERS,
+                                                      HostModule,
+                                                      run_concurrently,
+                                                      run_host_tasks)
+from ansible.module_utils.foreman_utils.transport import (
+    HEDGE_MIN_SAMPLES, HEDGE_SAMPLES, RETRY_MAX_WAIT, RETRY_WAIT,
+    AdaptiveConcurrency, EndpointSelector, RequestScheduler, TokenBucket)
@@ -0,0 +1,339 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""On-disk caches of api versions, GET answers and looked up ids"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+from ansible.module_utils.foreman_utils.common import (UNCACHED_RESOURCES,
+                                                       _endpoint,
+                                                       _endpoint_resource,
+                                                       ensure_dir,
+                                                       string_types,
+                                                       write_json)
+
+
+def _is_time(value):
+    # the files may have been written by anything, json booleans included
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class ApiVersionCache(object):
+    """On-disk cache of the foreman version of a server.
+
+    The client is built without asking the server for its version. The api
+    definitions of that version are read from the ones shipped or cached by
+    python-foreman, which fetches them from the server once per version.
+    """
+
+    def __init__(self, cache_dir, url, ttl):
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        self.path = os.path.join(os.path.expanduser(cache_dir),
+                                 'api-' + digest)
+        self.ttl = ttl
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name)) as cache_file:
+                return json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write(self, name, data):
+        try:
+            ensure_dir(self.path)
+            write_json(os.path.join(self.path, name), data)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def version(self):
+        entry = self._read('version.json')
+        if not isinstance(entry, dict) or not _is_time(entry.get('time')) \
+                or time.time() - entry['time'] > self.ttl:
+            return None
+        return entry.get('version')
+
+    def set_version(self, version):
+        self._write('version.json', {'version': version, 'time': time.time()})
+
+    def invalidate_version(self):
+        try:
+            os.unlink(os.path.join(self.path, 'version.json'))
+        except OSError:
+            pass
+
+
+class ResponseCache(object):
+    """On-disk cache of the answers of foreman to GET requests.
+
+    Answers of the api are stored by url, per server and user as they
+    depend on the permissions of the user. The ones with an ETag or
+    Last-Modified are validated with a conditional request every time they
+    are used, the others are used without asking foreman for ttl seconds,
+    except for the resources in UNCACHED_RESOURCES. Writes to a resource
+    drop its answers.
+    """
+
+    def __init__(self, cache_dir, url, user, ttl):
+        digest = hashlib.sha1((url + '\0' + user).encode('utf-8')).hexdigest()
+        self.path = os.path.join(os.path.expanduser(cache_dir),
+                                 'http-' + digest)
+        self.ttl = ttl
+
+    def _entry_path(self, url):
+        resource = _endpoint_resource(_endpoint(urlparse(url).path)) or '-'
+        digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, resource, digest + '.json')
+
+    def get(self, url):
+        try:
+            with open(self._entry_path(url)) as cache_file:
+                entry = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or entry.get('url') != url or \
+                not isinstance(entry.get('body'), string_types) or \
+                not _is_time(entry.get('time')):
+            return None
+        for field in ('etag', 'last_modified', 'content_type'):
+            if entry.get(field) is not None and \
+                    not isinstance(entry[field], string_types):
+                return None
+        if not entry.get('etag') and not entry.get('last_modified') and \
+                time.time() - entry['time'] > self.ttl:
+            return None
+        return entry
+
+    @staticmethod
+    def is_fresh(entry):
+        """Whether entry can be used without validating it"""
+        return not entry.get('etag') and not entry.get('last_modified')
+
+    def set(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        path = self._entry_path(url)
+        if not etag and not last_modified and \
+                (self.ttl <= 0 or os.path.basename(os.path.dirname(path)) in
+                 UNCACHED_RESOURCES):
+            return
+        try:
+            body = response.content.decode('utf-8')
+        except (UnicodeDecodeError, AttributeError):
+            return
+        entry = dict(url=url, etag=etag, last_modified=last_modified,
+                     content_type=response.headers.get('Content-Type'),
+                     body=body, time=time.time())
+        try:
+            ensure_dir(os.path.dirname(path))
+            write_json(path, entry)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def invalidate(self, url):
+        """Drops the answers of the resource of url"""
+        directory = os.path.dirname(self._entry_path(url))
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return
+        for name in names:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+_LOOKUP_CACHES = {}
+_LOOKUP_CACHES_LOCK = threading.Lock()
+
+
+def lookup_cache(module):
+    params = module.params
+    ttl = params.get('lookup_cache_ttl')
+    cache_dir = params.get('lookup_cache_dir')
+    if not ttl or ttl <= 0 or not cache_dir:
+        return None
+    key = (params['url'], params['foreman_user'],
+           os.path.expanduser(cache_dir))
+    with _LOOKUP_CACHES_LOCK:
+        if key not in _LOOKUP_CACHES:
+            digest = hashlib.sha1(('%s\n%s' % key[:2]).encode('utf-8'))
+            path = os.path.join(key[2],
+                                'lookup-%s.json' % digest.hexdigest())
+            _LOOKUP_CACHES[key] = LookupCache(
+                path, ttl, params.get('lookup_cache_size'))
+        return _LOOKUP_CACHES[key]
+
+
+class _FileLock(object):
+
+    def __init__(self, path, exclusive=False):
+        self.path = path
+        self.exclusive = exclusive
+        self.fd = None
+
+    def __enter__(self):
+        if HAS_FCNTL:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            if self.exclusive:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            else:
+                fcntl.flock(self.fd, fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+
+class _CacheLock(object):
+
+    def __init__(self, thread_lock, file_lock):
+        self.thread_lock = thread_lock
+        self.file_lock = file_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        try:
+            self.file_lock.__enter__()
+        except Exception:
+            self.thread_lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self.file_lock.__exit__(*exc)
+        finally:
+            self.thread_lock.release()
+
+
+class LookupCache(object):
+    """Cache of name to id resolutions stored in a json file.
+
+    Every fork running a foreman module against the same server and user
+    shares the file, access to it is serialized with a lock file. Entries
+    expire after ttl seconds and the oldest ones are evicted once the cache
+    holds more than max_entries. Any error accessing the file is handled as
+    a cache miss, the cache must never make a task fail.
+    """
+
+    def __init__(self, path, ttl, max_entries=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.served = set()
+        self._entries = {}
+        self._mtime = None
+        # serializes the threads of this process, the file lock only
+        # protects the file from other processes
+        self._thread_lock = threading.Lock()
+
+    @staticmethod
+    def _key(resource, name):
+        return resource + '/' + name
+
+    def _lock(self, exclusive=False):
+        return _CacheLock(self._thread_lock,
+                          _FileLock(self.path + '.lock', exclusive))
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._entries, self._mtime = {}, None
+            return self._entries
+        # the file is replaced on every write, so the inode changes too
+        mtime = (stat.st_ino, stat.st_mtime)
+        if mtime != self._mtime:
+            with open(self.path) as cache_file:
+                entries = json.load(cache_file)
+            if not isinstance(entries, dict):
+                entries = {}
+            # entries of an unexpected shape are dropped as misses
+            self._entries = dict(
+                (key, entry) for key, entry in entries.items()
+                if isinstance(entry, list) and len(entry) == 2 and
+                _is_time(entry[1]))
+            self._mtime = mtime
+        return self._entries
+
+    def _store(self, entries):
+        now = time.time()
+        entries = dict((k, v) for k, v in entries.items()
+                       if now - v[1] <= self.ttl)
+        if self.max_entries and len(entries) > self.max_entries:
+            newest = sorted(entries.items(), key=lambda item: item[1][1],
+                            reverse=True)[:self.max_entries]
+            entries = dict(newest)
+        write_json(self.path, entries)
+        self._entries, self._mtime = entries, None
+
+    def get(self, resource, name):
+        key = self._key(resource, name)
+        try:
+            with self._lock():
+                entry = self._load().get(key)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        self.served.add(key)
+        return entry[0]
+
+    def set(self, resource, name, value):
+        self.set_many(resource, {name: value})
+
+    def set_many(self, resource, values):
+        try:
+            ensure_dir(os.path.dirname(self.path))
+            with self._lock(exclusive=True):
+                entries = dict(self._load())
+                now = time.time()
+                for name, value in values.items():
+                    entries[self._key(resource, name)] = [value, now]
+                self._store(entries)
+        except (IOError, OSError, ValueError):
+            pass
+
+    def invalidate(self, keys):
+        keys = set(keys)
+        try:
+            with self._lock(exclusive=True):
+                entries = dict(self._load())
+                for key in keys:
+                    entries.pop(key, None)
+                self._store(entries)
+        except (IOError, OSError, ValueError):
+            pass
+        self.served.difference_update(keys)
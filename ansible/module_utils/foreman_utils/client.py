@@ -0,0 +1,197 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Building and sharing the python-foreman client"""
+
+import threading
+from functools import partial
+
+from ansible.module_utils.foreman_utils.caches import (ApiVersionCache,
+                                                       ResponseCache)
+from ansible.module_utils.foreman_utils.metrics import CallMetrics
+from ansible.module_utils.foreman_utils.transport import (EndpointSelector,
+                                                          _configure_session,
+                                                          _request_scheduler)
+
+
+API_VERSION = 2
+
+
+def has_foreman_client():
+    """Whether python-foreman is installed, found without importing it"""
+    try:
+        from importlib.util import find_spec
+    except ImportError:
+        import imp
+        try:
+            imp.find_module('foreman')
+        except ImportError:
+            return False
+        return True
+    return find_spec('foreman') is not None
+
+
+def _build_client(module, metrics=None):
+    from foreman.client import Foreman
+
+    params = module.params
+    auth = (params['foreman_user'], params['foreman_password'])
+    ttl = params.get('api_cache_ttl')
+    cache_dir = params.get('lookup_cache_dir')
+    if not ttl or ttl <= 0 or not cache_dir:
+        return Foreman(params['url'], auth, api_version=API_VERSION)
+
+    cache = ApiVersionCache(cache_dir, params['url'], ttl)
+    version = cache.version()
+    if metrics is not None:
+        metrics.record_cache('api', version is not None)
+    if version is not None:
+        try:
+            return Foreman(params['url'], auth, version=version,
+                           api_version=API_VERSION)
+        except Exception:
+            # the server may have been upgraded, detect its version again
+            cache.invalidate_version()
+    client = Foreman(params['url'], auth, api_version=API_VERSION)
+    cache.set_version(client.version)
+    return client
+
+
+def build_foreman_client(module, metrics=None):
+    params = module.params
+    client = _build_client(module, metrics)
+    pool_size = params.get('pool_size') or 1
+    timeout = None
+    if params.get('connect_timeout') or params.get('read_timeout'):
+        timeout = (params.get('connect_timeout') or None,
+                   params.get('read_timeout') or None)
+    response_cache = None
+    if params.get('http_cache') and params.get('lookup_cache_dir'):
+        response_cache = ResponseCache(params['lookup_cache_dir'],
+                                       params['url'], params['foreman_user'],
+                                       params.get('http_cache_ttl') or 0)
+    endpoints = None
+    if params.get('endpoints'):
+        endpoints = EndpointSelector([params['url']] +
+                                     list(params['endpoints']))
+    _configure_session(client, pool_size,
+                       _request_scheduler(module, pool_size),
+                       timeout=timeout, retries=params.get('retries') or 0,
+                       hedge_percentile=params.get('hedge_percentile') or 0,
+                       metrics=metrics, response_cache=response_cache,
+                       endpoints=endpoints)
+    return client
+
+
+def connection_stats(foreman_client):
+    """Returns the number of requests done and connections opened/reused"""
+    if isinstance(foreman_client, LazyForeman):
+        foreman_client = foreman_client.built_client
+    adapter = getattr(foreman_client, 'pooled_adapter', None)
+    opened = requests = 0
+    if adapter is not None:
+        requests = adapter.requests
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            opened += pools[key].num_connections
+    return dict(requests=requests, opened=opened,
+                reused=max(requests - opened, 0))
+
+
+def _exit_with_stats(exit_function, foreman_client, baseline, mark,
+                     **kwargs):
+    if 'foreman_metrics' not in kwargs:
+        kwargs['foreman_metrics'] = foreman_client.metrics.summary(mark)
+        adapter = getattr(foreman_client.built_client, 'pooled_adapter',
+                          None)
+        if adapter is not None and adapter.endpoints is not None:
+            kwargs['foreman_metrics']['servers'] = adapter.endpoints.stats()
+    stats = connection_stats(foreman_client)
+    stats['requests'] -= baseline['requests']
+    stats['opened'] -= baseline['opened']
+    stats['reused'] = max(stats['requests'] - stats['opened'], 0)
+    kwargs.setdefault('api_calls', stats.pop('requests'))
+    kwargs.setdefault('connections', stats)
+    exit_function(**kwargs)
+
+
+class LazyForeman(object):
+    """Proxy of the foreman client built on its first use.
+
+    Building the client requires detecting the foreman version and loading
+    the api definitions, which is skipped when a module doesn't need to
+    talk to foreman at all.
+    """
+
+    def __init__(self, module):
+        self._module = module
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.metrics = CallMetrics()
+
+    @property
+    def built_client(self):
+        """The client if it has been already built, None otherwise"""
+        return self._client
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = build_foreman_client(self._module,
+                                                        self.metrics)
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+_SHARED_CLIENTS = {}
+_SHARED_CLIENTS_LOCK = threading.Lock()
+
+
+def get_foreman_client(module, shared=False):
+    """Returns the client to talk to the foreman server of the module.
+
+    The results of the module report the number of api calls done with the
+    client and the connections opened and reused to do them, and the
+    foreman_metrics of the calls, traced to trace_file if given. A shared
+    client is kept for the life of the process and reused by the later
+    calls for the same server and user, as done by the action plugins.
+    Reads are spread over the equivalent endpoints given, if any, see
+    EndpointSelector.
+    """
+    if shared:
+        key = (module.params['url'],
+               tuple(module.params.get('endpoints') or ()),
+               module.params['foreman_user'],
+               module.params['foreman_password'])
+        with _SHARED_CLIENTS_LOCK:
+            client = _SHARED_CLIENTS.get(key)
+            if client is None:
+                client = _SHARED_CLIENTS[key] = LazyForeman(module)
+    else:
+        client = LazyForeman(module)
+    client.metrics.trace_to(module.params.get('trace_file'),
+                            url=module.params['url'],
+                            name=module.params.get('name'))
+    baseline = connection_stats(client)
+    mark = client.metrics.mark()
+    module.exit_json = partial(_exit_with_stats, module.exit_json, client,
+                               baseline, mark)
+    module.fail_json = partial(_exit_with_stats, module.fail_json, client,
+                               baseline, mark)
+    return client
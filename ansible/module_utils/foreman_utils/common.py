@@ -0,0 +1,191 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Constants, errors and file helpers shared by foreman_utils"""
+
+import errno
+import json
+import os
+import re
+import tempfile
+import threading
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'ansible-foreman')
+
+# Resources whose ids are never served from the lookup cache, the
+# existence of a host must always be checked against foreman.
+UNCACHED_RESOURCES = ['hosts']
+
+# Requests retried when they fail, they don't change anything in foreman
+IDEMPOTENT_METHODS = ['GET', 'HEAD']
+
+# Answers of an overloaded or restarting foreman, worth retrying
+RETRY_STATUSES = [429, 502, 503, 504]
+
+# Errors of foreman rejecting an association whose id doesn't exist, the
+# ones given for an *_id field also include MISSING_ID_FIELD_ERRORS
+MISSING_ID_ERRORS = ['not found', 'does not exist', "doesn't exist",
+                     'must exist']
+MISSING_ID_FIELD_ERRORS = ["can't be blank", 'is invalid']
+
+
+def _start_thread(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = int(round((len(values) - 1) * percent / 100.0))
+    return values[index]
+
+
+def _endpoint(path):
+    """Path of a request without its query and with its ids as :id"""
+    path = path.split('?', 1)[0]
+    return '/'.join(':id' if part.isdigit() else part
+                    for part in path.split('/'))
+
+
+def _endpoint_resource(endpoint):
+    parts = [part for part in endpoint.split('/')
+             if part and part != 'api' and not re.match(r'^v\d+$', part)]
+    return parts[0] if parts else None
+
+
+def error_message(error):
+    return getattr(error, 'message', None) or str(error)
+
+
+def error_status(error):
+    """Returns the http status code of a failed foreman request, if any"""
+    res = getattr(error, 'res', None)
+    status = getattr(res, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'status_code', None)
+    return status
+
+
+def is_transient_error(error):
+    """Whether a failed request may succeed if sent again"""
+    status = error_status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    try:
+        from requests.exceptions import ConnectionError, Timeout
+    except ImportError:
+        return False
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+def _error_messages(error):
+    """Returns the (field, message) pairs of the answer of a failed foreman
+    request, field is None for the messages of the whole request"""
+    try:
+        body = error.res.json()
+    except Exception:
+        return []
+    if isinstance(body, dict) and isinstance(body.get('error'), dict):
+        body = body['error']
+    if not isinstance(body, dict):
+        return []
+    messages = []
+    errors = body.get('errors')
+    if isinstance(errors, dict):
+        for field, field_errors in errors.items():
+            if isinstance(field_errors, string_types):
+                field_errors = [field_errors]
+            for message in field_errors or []:
+                messages.append((field, message))
+    full_messages = body.get('full_messages') or []
+    if isinstance(full_messages, string_types):
+        full_messages = [full_messages]
+    for message in [body.get('message')] + list(full_messages):
+        if message:
+            messages.append((None, message))
+    return messages
+
+
+def is_not_found_error(error):
+    """Whether a failed request refers to an id which doesn't exist.
+
+    That's a 404, which python-foreman turns into ForemanNotFoundElement
+    when creating a host, or a 422 whose errors reject an association. Any
+    other 422 is a validation error which would fail again with other ids.
+    """
+    status = error_status(error)
+    if status == 404 or isinstance(error, ForemanNotFoundElement):
+        return True
+    if status != 422:
+        return False
+    for field, message in _error_messages(error):
+        expected = MISSING_ID_ERRORS
+        if field and str(field).endswith('_id'):
+            expected = MISSING_ID_ERRORS + MISSING_ID_FIELD_ERRORS
+        message = str(message).lower()
+        if any(text in message for text in expected):
+            return True
+    return False
+
+
+def ensure_dir(path):
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def write_json(path, data):
+    # written to a temporary file and renamed, readers never see a
+    # partially written file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'w') as json_file:
+            json.dump(data, json_file)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+class ModuleExit(Exception):
+    """Raised with the result of a module which can't exit the process"""
+
+    def __init__(self, result):
+        super(ModuleExit, self).__init__(result.get('msg'))
+        self.result = result
+
+
+class ForemanNotFoundElement(Exception):
+
+    def __init__(self, msg, names=None):
+        super(ForemanNotFoundElement, self).__init__(msg)
+        self.names = names or []
+
+
+class ForemanMoreThanExpectedElements(Exception):
+
+    def __init__(self, msg, names=None):
+        super(ForemanMoreThanExpectedElements, self).__init__(msg)
+        self.names = names or []
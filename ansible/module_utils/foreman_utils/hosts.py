@@ -0,0 +1,432 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Creation, update, deletion and power of foreman hosts"""
+
+from functools import partial
+
+from ansible.module_utils.foreman_utils.common import (ForemanNotFoundElement,
+                                                       error_message,
+                                                       error_status,
+                                                       is_not_found_error,
+                                                       is_transient_error,
+                                                       string_types)
+from ansible.module_utils.foreman_utils.journal import operation_journal
+from ansible.module_utils.foreman_utils.search import (
+    id_from_name, invalidate_served_lookups, project_fields,
+    single_element_from_name, subnet_from_ip, subnet_from_network)
+from ansible.module_utils.foreman_utils.tasks import run_concurrently
+
+
+# Power state reached by the hosts after every power action
+POWER_STATES = {'start': 'on', 'on': 'on', 'reboot': 'on', 'soft': 'on',
+                'reset': 'on', 'cycle': 'on', 'stop': 'off', 'off': 'off',
+                'poweroff': 'off'}
+
+# Host arguments that can be changed on an existing host, build is left
+# out on purpose, setting it again would provision the host again
+UPDATABLE_HOST_ARGS = ['organization_id', 'location_id', 'hostgroup_id',
+                       'ptable_id', 'subnet_id', 'ip', 'mac']
+
+# Types of the interfaces as given to foreman and as shown by it
+INTERFACE_TYPES = {'nic::managed': 'interface', 'nic::bmc': 'bmc',
+                   'nic::bond': 'bond', 'nic::bridge': 'bridge'}
+
+# Host arguments resolved from names: (argument, parameter, resource)
+HOST_REFERENCES = [
+    ('organization_id', 'organization_name', 'organizations'),
+    ('location_id', 'location_name', 'locations'),
+    ('hostgroup_id', 'hostgroup_name', 'hostgroups'),
+    ('compute_resource_id', 'compute_resource', 'computeresources'),
+    ('compute_profile_id', 'compute_profile', 'computeprofiles'),
+    ('ptable_id', 'ptable_name', 'ptables'),
+]
+
+
+def exit_hostvars(module, host, changed=True, result="success", **kwargs):
+    name = module.params['name']
+    if host is None:
+        hostvars = {}
+    else:
+        hostvars = {"name": name, "id": host["id"], "ip": host["ip"]}
+    journal = operation_journal(module)
+    if journal is not None and not kwargs.get('journaled'):
+        state = module.params['state']
+        journal.record_host(name, state,
+                            hostvars if state == 'present' else None)
+    module.exit_json(
+        changed=changed, host=hostvars, result=result, **kwargs)
+
+
+def skip_journaled_host(module):
+    """Exits if the journal of the module records its host as already left
+    in the desired state by an earlier run"""
+    journal = operation_journal(module)
+    if journal is None:
+        return
+    record = journal.host(module.params['name'], module.params['state'])
+    if record is not None:
+        exit_hostvars(module, record.get('host'), changed=False,
+                      journaled=True)
+
+
+def journaled_references(module):
+    """Returns the ids resolved by earlier runs, keyed by (resource, name)"""
+    journal = operation_journal(module)
+    if journal is None:
+        return {}
+    return journal.resolved_ids()
+
+
+def _literal(value):
+    # list parameters are given as python literals in a string
+    if isinstance(value, string_types):
+        return eval(value)
+    return value
+
+
+def delete_host(module, foreman_client, element=None):
+    name = module.params['name']
+    if element is None:
+        element = single_element_from_name('hosts', name, module,
+                                           foreman_client)
+    id = element["id"]
+    ip = element["ip"]
+    host = {"name": name, "id": id, "ip": ip}
+    try:
+        foreman_client.destroy_hosts(id)
+    except Exception as e:
+        module.fail_json(msg="Error in deleting host: %s" %
+                         error_message(e))
+    exit_hostvars(module, host, changed=True)
+
+
+def host_args(module, foreman_client, resolved=None):
+    """Builds the arguments to create the host described by module.params.
+
+    The ids of the referenced objects not found in resolved, a dict keyed
+    by (resource, name), are looked up concurrently and recorded in the
+    journal of the module, if any.
+    """
+    resolved = resolved or {}
+    params = module.params
+    args = {}
+    args['name'] = params['name']
+    args['build'] = params['build']
+
+    if params['hostgroup_name']:
+        args['mac'] = params['mac']
+
+    lookups = []
+    for arg, param, resource in HOST_REFERENCES:
+        name = params[param]
+        if not name and param not in ('organization_name', 'location_name'):
+            continue
+        if (resource, name) in resolved:
+            args[arg] = resolved[(resource, name)]
+        else:
+            lookups.append((arg, (resource, name),
+                            partial(id_from_name, resource, name)))
+
+    if params['root_pass']:
+        args['root_pass'] = params['root_pass']
+
+    if params['ip']:
+        args['ip'] = params['ip']
+
+    if params['interfaces_attributes']:
+        args['interfaces_attributes'] = \
+            _literal(params['interfaces_attributes'])
+
+    network = params['network']
+    if network and ('network', network) in resolved:
+        args['subnet_id'] = resolved[('network', network)]
+    elif network:
+        lookups.append(('subnet_id', ('network', network),
+                        partial(subnet_from_network, network)))
+    elif params['ip'] and params.get('infer_subnet'):
+        lookups.append(('subnet_id', None,
+                        partial(subnet_from_ip, params['ip'])))
+
+    # The lookups don't depend on each other, resolve them all at once
+    ids = run_concurrently(module, foreman_client,
+                           [lookup for _, _, lookup in lookups])
+    for (arg, _, _), value in zip(lookups, ids):
+        if value is not None:
+            args[arg] = value
+    journal = operation_journal(module)
+    if journal is not None:
+        journal.record_resolved(dict((key, value) for (_, key, _), value
+                                     in zip(lookups, ids) if key))
+
+    if args.get('interfaces_attributes') and params.get('infer_subnet'):
+        args['interfaces_attributes'] = _infer_interfaces_subnets(
+            module, foreman_client, args['interfaces_attributes'])
+    return args
+
+
+def _infer_interfaces_subnets(module, foreman_client, interfaces):
+    inferred = []
+    for interface in interfaces:
+        interface = dict(interface)
+        if interface.get('ip') and not interface.get('subnet_id'):
+            subnet_id = subnet_from_ip(interface['ip'], module,
+                                       foreman_client)
+            if subnet_id is not None:
+                interface['subnet_id'] = subnet_id
+        inferred.append(interface)
+    return inferred
+
+
+def _post_host(foreman_client, args):
+    try:
+        host = foreman_client.create_hosts(host=args)
+    except Exception as e:
+        return None, e
+    if not host:
+        # python-foreman answers a 404 with an empty list
+        return None, ForemanNotFoundElement('Not found creating host ' +
+                                            str(args.get('name')))
+    return host, None
+
+
+def create_host(module, foreman_client, resolved=None):
+    params = module.params
+    args = host_args(module, foreman_client, resolved)
+
+    parameters = None
+    if params['host_parameters_attributes']:
+        # Sent along with the host, so it's created with a single request
+        parameters = _literal(params['host_parameters_attributes'])
+        args['host_parameters_attributes'] = parameters
+
+    host, error = _post_host(foreman_client, args)
+
+    if error is not None and is_transient_error(error):
+        # The host may have been created although its answer was lost,
+        # only post it again if it doesn't exist.
+        host = single_element_from_name('hosts', params['name'], module,
+                                        foreman_client)
+        if host is None:
+            host, error = _post_host(foreman_client, args)
+        else:
+            error = None
+
+    if error is not None and is_not_found_error(error) and \
+            (invalidate_served_lookups(module) or
+             resolved and operation_journal(module) is not None):
+        # Some ids came from the lookup cache or the journal and do not
+        # exist anymore, resolve them again and retry.
+        args.update(host_args(module, foreman_client))
+        host, error = _post_host(foreman_client, args)
+
+    if error is not None and parameters and \
+            error_status(error) in (400, 422):
+        # The server doesn't accept the parameters when creating the host,
+        # set them once the host is created.
+        del args['host_parameters_attributes']
+        host, error = _post_host(foreman_client, args)
+        if error is None:
+            hostparams = {'host_parameters_attributes': parameters}
+            try:
+                host = foreman_client.update_hosts(host=hostparams,
+                                                   id=host['id'])
+            except Exception as e:
+                module.fail_json(msg="Error creating host: %s" %
+                                 error_message(e))
+
+    if error is not None:
+        module.fail_json(msg="Error creating host: %s" %
+                         error_message(error))
+    exit_hostvars(module, host)
+
+
+def _same_value(desired, current):
+    # foreman returns booleans and numbers where strings may be given
+    return str(desired).lower() == str(current).lower()
+
+
+def _parameters_changes(desired, current):
+    current = dict((parameter['name'], parameter)
+                   for parameter in current or [])
+    changes = []
+    for parameter in desired:
+        existing = current.get(parameter['name'])
+        if existing is None:
+            changes.append(dict(parameter))
+        elif not _same_value(parameter.get('value'), existing.get('value')):
+            change = dict(parameter)
+            change['id'] = existing['id']
+            changes.append(change)
+    return changes
+
+
+def _interface_value(key, value):
+    if key == 'type':
+        return INTERFACE_TYPES.get(str(value).lower(), value)
+    return value
+
+
+def _find_interface(interface, current):
+    """Returns the interface of current matching interface, by its mac or,
+    without mac, by its identifier and then by its ip"""
+    keys = ['mac'] if interface.get('mac') else ['identifier', 'ip']
+    for key in keys:
+        if not interface.get(key):
+            continue
+        for existing in current:
+            if _same_value(interface[key], existing.get(key)):
+                return existing
+    return None
+
+
+def _interfaces_changes(desired, current):
+    current = list(current or [])
+    changes = []
+    for interface in desired:
+        existing = _find_interface(interface, current)
+        if existing is None:
+            changes.append(dict(interface))
+            continue
+        current.remove(existing)
+        # only the keys shown by foreman can be compared, the others, as
+        # the password of a bmc, are kept as they are
+        change = dict((key, value) for key, value in interface.items()
+                      if key in existing and
+                      not _same_value(_interface_value(key, value),
+                                      existing[key]))
+        if change:
+            change['id'] = existing['id']
+            changes.append(change)
+    return changes
+
+
+def update_host(module, foreman_client, host, resolved=None):
+    """Updates an existing host to match the module params.
+
+    Only the fields which differ from the host record are sent, nothing is
+    written if the host is already up to date. Parameters and interfaces
+    not given in the module params are kept.
+    """
+    params = module.params
+    args = host_args(module, foreman_client, resolved)
+    try:
+        current = foreman_client.show_hosts(id=host['id'])
+    except Exception as e:
+        module.fail_json(msg="Error getting host: %s" % error_message(e))
+
+    changes = dict((arg, args[arg]) for arg in UPDATABLE_HOST_ARGS
+                   if arg in args and not _same_value(args[arg],
+                                                      current.get(arg)))
+    if params['host_parameters_attributes']:
+        parameters = _parameters_changes(
+            _literal(params['host_parameters_attributes']),
+            current.get('parameters'))
+        if parameters:
+            changes['host_parameters_attributes'] = parameters
+    if 'interfaces_attributes' in args:
+        interfaces = _interfaces_changes(args['interfaces_attributes'],
+                                         current.get('interfaces'))
+        if interfaces:
+            changes['interfaces_attributes'] = interfaces
+
+    if not changes:
+        exit_hostvars(module, host, changed=False)
+    try:
+        host = foreman_client.update_hosts(id=host['id'], host=changes)
+    except Exception as e:
+        module.fail_json(msg="Error updating host: %s" % error_message(e))
+    exit_hostvars(module, host, updated=sorted(changes))
+
+
+def check_host_state(module, host):
+    """Exits if the host is already in the desired state.
+
+    Returns the host found, if any. Existing hosts are only kept as they
+    are when the module isn't asked to update them.
+    """
+    state = module.params['state']
+    if host and state == 'present' and not module.params.get('update'):
+        exit_hostvars(module, host, changed=False)
+    if host and state == 'absent':
+        return host
+    if state == 'absent':
+        exit_hostvars(module, host=None, changed=False)
+    return host
+
+
+def get_host_state(module, foreman_client):
+    host = single_element_from_name('hosts', module.params['name'],
+                                    module, foreman_client)
+    return check_host_state(module, host)
+
+
+def ensure_host(module, foreman_client):
+    """Creates, updates or deletes the host of the module and exits.
+
+    A host the journal of the module, if any, records as done is skipped
+    without asking foreman, see OperationJournal.
+    """
+    skip_journaled_host(module)
+    if module.params['state'] == 'present':
+        host = get_host_state(module, foreman_client)
+        resolved = journaled_references(module)
+        if host:
+            update_host(module, foreman_client, host, resolved)
+        create_host(module, foreman_client, resolved)
+    elif module.params['state'] == 'absent':
+        host = get_host_state(module, foreman_client)
+        delete_host(module, foreman_client, host)
+
+
+def host_status(foreman_client, host):
+    return foreman_client.do_get("/api/hosts/" + str(host['id']) + "/status",
+                                 "")
+
+
+def host_facts(module, foreman_client, host=None):
+    """Returns the foreman_host and foreman_status facts of the host of the
+    module, host is given when it was already found"""
+    if host is None:
+        host = single_element_from_name('hosts', module.params['name'],
+                                        module, foreman_client)
+    if host is None:
+        raise ForemanNotFoundElement('No element ' + module.params['name'] +
+                                     ' in hosts')
+    return dict(foreman_host=project_fields(host, module.params['fields']),
+                foreman_status=host_status(foreman_client, host))
+
+
+def exit_host_facts(module, foreman_client):
+    """Adds the facts of the host of the module and exits"""
+    module.exit_json(changed=False,
+                     ansible_facts=host_facts(module, foreman_client))
+
+
+def power_action(foreman_client, host_id, action):
+    url = '/api/hosts/' + str(host_id) + '/power?power_action=' + action
+    return foreman_client.do_put(url, '')
+
+
+def power_state(foreman_client, host_id):
+    return power_action(foreman_client, host_id, 'state').get('power')
+
+
+def apply_power_action(module, foreman_client):
+    """Applies the power action of the module to its host and exits"""
+    host_id = id_from_name('hosts', module.params['name'],
+                           module, foreman_client)
+    power_action(foreman_client, host_id, module.params['power_action'])
+    module.exit_json(changed='true', result='success')
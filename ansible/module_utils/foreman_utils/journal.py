@@ -0,0 +1,143 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Journal of the host operations completed by a run, to resume it"""
+
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+from ansible.module_utils.foreman_utils.common import ensure_dir
+
+
+class OperationJournal(object):
+    """Append-only journal of the work completed by a run of host tasks.
+
+    Every line is a json record of either an id resolved from a name or a
+    host left in its desired state, present or absent, with its id and
+    ip. A run restarted with the same journal skips the hosts already done
+    and reuses the ids resolved, so it only pays for the work left. Every
+    record is appended with a single write under a lock, so the forks of
+    a playbook can share the journal, and a line left incomplete by a
+    crash is ignored. As with the lookup cache, an error accessing the
+    file must never make a task fail, the work is just done again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._resolved = {}
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as journal_file:
+                for line in journal_file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._apply(record)
+        except (IOError, OSError):
+            pass
+
+    def _apply(self, record):
+        if record.get('type') == 'resolved':
+            self._resolved[(record['resource'], record['name'])] = \
+                record['id']
+        elif record.get('type') == 'host':
+            self._hosts[record['name']] = record
+
+    def _append(self, records):
+        data = ''.join(json.dumps(record, sort_keys=True) + '\n'
+                       for record in records).encode('utf-8')
+        try:
+            if os.path.dirname(self.path):
+                ensure_dir(os.path.dirname(self.path))
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT,
+                         0o600)
+            try:
+                if HAS_FCNTL:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                size = os.lseek(fd, 0, os.SEEK_END)
+                if size:
+                    os.lseek(fd, size - 1, os.SEEK_SET)
+                    if os.read(fd, 1) != b'\n':
+                        # the last line was cut by a crash
+                        data = b'\n' + data
+                os.write(fd, data)
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except (IOError, OSError):
+            pass
+
+    def resolved_ids(self):
+        """Returns a dict with the ids resolved, keyed by (resource, name)"""
+        with self._lock:
+            return dict(self._resolved)
+
+    def record_resolved(self, resolved):
+        """Records the ids of resolved, a dict keyed by (resource, name),
+        which aren't in the journal yet"""
+        with self._lock:
+            records = [dict(type='resolved', resource=key[0], name=key[1],
+                            id=id)
+                       for key, id in sorted(resolved.items())
+                       if id is not None and self._resolved.get(key) != id]
+            for record in records:
+                self._apply(record)
+            if records:
+                self._append(records)
+
+    def host(self, name, state):
+        """Returns the record of the host name if it was left in state"""
+        with self._lock:
+            record = self._hosts.get(name)
+        if record is None or record['state'] != state:
+            return None
+        return record
+
+    def record_host(self, name, state, host=None):
+        """Records the host name as left in state, host are its vars"""
+        record = dict(type='host', name=name, state=state,
+                      host=host or None, time=round(time.time(), 3))
+        with self._lock:
+            self._apply(record)
+            self._append([record])
+
+
+_JOURNALS = {}
+_JOURNALS_LOCK = threading.Lock()
+
+
+def operation_journal(module):
+    """Returns the journal given in the journal param of module, if any"""
+    path = module.params.get('journal')
+    if not path:
+        return None
+    path = os.path.abspath(os.path.expanduser(path))
+    with _JOURNALS_LOCK:
+        if path not in _JOURNALS:
+            _JOURNALS[path] = OperationJournal(path)
+        return _JOURNALS[path]
@@ -0,0 +1,123 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Metrics of the requests done by the foreman client"""
+
+import json
+import os
+import threading
+import time
+
+from ansible.module_utils.foreman_utils.common import (_endpoint,
+                                                       _endpoint_resource,
+                                                       _percentile)
+
+
+class CallMetrics(object):
+    """Record of the requests done by a foreman client and of the caches
+    used instead of them.
+
+    Every request is also appended as a json line to trace_file, if set,
+    along with context, so the traces of all the tasks of a playbook run
+    can be aggregated.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self.caches = {}
+        self.trace_file = None
+        self.context = {}
+        self._lock = threading.Lock()
+
+    def trace_to(self, trace_file, **context):
+        self.trace_file = trace_file and os.path.expanduser(trace_file)
+        self.context = context
+
+    def record(self, method, path, status, size, duration, wait=0,
+               error=None):
+        endpoint = _endpoint(path)
+        with self._lock:
+            self.calls.append(('%s %s' % (method, endpoint), status, size,
+                               duration))
+        if self.trace_file:
+            call = dict(self.context, method=method, endpoint=endpoint,
+                        resource=_endpoint_resource(endpoint),
+                        status=status, bytes=size, time=round(duration, 6),
+                        wait=round(wait, 6), error=error, pid=os.getpid(),
+                        timestamp=round(time.time(), 6))
+            self._trace(call)
+
+    def _trace(self, call):
+        line = json.dumps(call, sort_keys=True) + '\n'
+        try:
+            # a single write of the line to a file opened for appending,
+            # so the lines of concurrent tasks don't mix
+            fd = os.open(self.trace_file,
+                         os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                os.write(fd, line.encode('utf-8'))
+            finally:
+                os.close(fd)
+        except (IOError, OSError):
+            pass
+
+    def record_cache(self, name, hit):
+        with self._lock:
+            counters = self.caches.setdefault(name, [0, 0])
+            counters[0 if hit else 1] += 1
+
+    def mark(self):
+        """Returns the point from which summary() reports"""
+        with self._lock:
+            return len(self.calls), dict((name, list(counters)) for
+                                         name, counters in
+                                         self.caches.items())
+
+    def summary(self, mark=None):
+        """Returns the counts and latencies per endpoint and the cache hits
+        and misses since mark"""
+        first, caches = mark or (0, {})
+        with self._lock:
+            calls = self.calls[first:]
+            current = dict((name, list(counters)) for name, counters in
+                           self.caches.items())
+        endpoints = {}
+        for key, status, size, duration in calls:
+            endpoints.setdefault(key, []).append((status, size, duration))
+        summary = dict(calls=len(calls),
+                       time=round(sum(call[3] for call in calls), 3),
+                       endpoints={}, cache={})
+        for key, records in endpoints.items():
+            durations = [record[2] for record in records]
+            summary['endpoints'][key] = dict(
+                calls=len(records),
+                errors=len([record for record in records
+                            if record[0] is None or record[0] >= 400]),
+                bytes=sum(record[1] for record in records),
+                total=round(sum(durations), 3),
+                p50=round(_percentile(durations, 50), 3),
+                p95=round(_percentile(durations, 95), 3))
+        for name, (hits, misses) in current.items():
+            previous = caches.get(name, [0, 0])
+            summary['cache'][name] = dict(hits=hits - previous[0],
+                                          misses=misses - previous[1])
+        return summary
+
+
+def record_cache(foreman_client, name, hit):
+    """Records a hit or miss of the cache name in the client metrics"""
+    metrics = foreman_client.__dict__.get('metrics')
+    if metrics is not None:
+        metrics.record_cache(name, hit)
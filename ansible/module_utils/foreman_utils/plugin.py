@@ -0,0 +1,90 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Stand-in of AnsibleModule used by the plugins"""
+
+from ansible.module_utils.foreman_utils.common import ModuleExit, string_types
+from ansible.module_utils.foreman_utils.spec import foreman_argument_spec
+
+
+BOOLEANS_TRUE = ['y', 'yes', 'on', '1', 'true', 't']
+BOOLEANS_FALSE = ['n', 'no', 'off', '0', 'false', 'f']
+
+
+class PluginModule(object):
+    """Stand-in of AnsibleModule to use foreman_utils from plugins.
+
+    params are checked against argument_spec, foreman_argument_spec() by
+    default: the ones not given take their default value and the typed
+    ones are converted. exit_json and fail_json raise ModuleExit with the
+    result.
+    """
+
+    def __init__(self, params, argument_spec=None):
+        if argument_spec is None:
+            argument_spec = foreman_argument_spec()
+        unknown = sorted(set(params) - set(argument_spec))
+        if unknown:
+            self.fail_json(msg='Unsupported parameters: %s' %
+                           ', '.join(unknown))
+        self.params = {}
+        for name, spec in argument_spec.items():
+            value = params.get(name)
+            if value is None:
+                if spec.get('required'):
+                    self.fail_json(msg='missing required arguments: %s' %
+                                   name)
+                value = spec.get('default')
+            if value is not None:
+                value = self._convert(name, value, spec)
+            self.params[name] = value
+
+    def _convert(self, name, value, spec):
+        kind = spec.get('type')
+        try:
+            if kind == 'bool':
+                value = self.boolean(value)
+            elif kind == 'int':
+                value = int(value)
+            elif kind == 'float':
+                value = float(value)
+            elif kind == 'list' and isinstance(value, string_types):
+                value = [item.strip() for item in value.split(',')]
+        except (TypeError, ValueError):
+            self.fail_json(msg='%s must be of type %s' % (name, kind))
+        choices = spec.get('choices')
+        if choices:
+            if isinstance(value, bool) and str(value).lower() in choices:
+                value = str(value).lower()
+            if value not in choices:
+                self.fail_json(msg='value of %s must be one of: %s, got: %s'
+                               % (name, ', '.join(choices), value))
+        return value
+
+    def boolean(self, value):
+        if isinstance(value, bool):
+            return value
+        if str(value).lower() in BOOLEANS_TRUE:
+            return True
+        if str(value).lower() in BOOLEANS_FALSE:
+            return False
+        raise ValueError('%s is not a valid boolean' % value)
+
+    def exit_json(self, **kwargs):
+        raise ModuleExit(kwargs)
+
+    def fail_json(self, **kwargs):
+        kwargs['failed'] = True
+        raise ModuleExit(kwargs)
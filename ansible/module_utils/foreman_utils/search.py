@@ -0,0 +1,477 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Searches of foreman elements and resolution of names to ids"""
+
+import binascii
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+from ansible.module_utils.foreman_utils.caches import lookup_cache
+from ansible.module_utils.foreman_utils.common import (
+    UNCACHED_RESOURCES, ForemanMoreThanExpectedElements,
+    ForemanNotFoundElement, ensure_dir, error_message, write_json)
+from ansible.module_utils.foreman_utils.metrics import record_cache
+
+
+INDEXED_RESOURCES = ['hosts', 'locations', 'hostgroups', 'ptables',
+                     'domains', 'subnets', 'computeprofiles',
+                     'computeresources']
+UNINDEXED_RESOURCES = ['organizations']
+
+# Elements requested per page when searching
+PAGE_SIZE = 100
+
+# Names resolved per search query, keeps the query string within limits
+BATCH_SIZE = 50
+
+
+def _query_options(thin, per_page):
+    options = []
+    if thin:
+        # only the id and name of every element are returned
+        options.append(('thin', 'true'))
+    if per_page:
+        options.append(('per_page', per_page))
+    return options
+
+
+def _index(foreman_client, resource, search, options):
+    """Calls the index method of resource with the options it accepts.
+
+    The methods of python-foreman only take the params in the api
+    definitions of the server, thin is unknown to the older ones.
+    """
+    try:
+        from inspect import getfullargspec as getargspec
+    except ImportError:
+        from inspect import getargspec
+
+    index = getattr(foreman_client, 'index_' + resource)
+    try:
+        spec = getargspec(index)
+    except TypeError:
+        spec = None
+    if spec is not None and not spec[2]:
+        options = [(name, value) for name, value in options
+                   if name in spec[0]]
+    return index(search=search, **dict(options))
+
+
+def elements_from_name(resource, name, module, foreman_client, thin=False,
+                       limit=None):
+    results = []
+    options = _query_options(thin, limit)
+    try:
+        if resource in INDEXED_RESOURCES:
+            search = 'name=' + '"' + name + '"'
+            results = _index(foreman_client, resource, search,
+                             options)['results']
+        elif resource in UNINDEXED_RESOURCES:
+            search = 'search=name=' + '"' + name + '"'
+            if options:
+                search += '&' + urlencode(options)
+            results = foreman_client.do_get('/api/' + resource,
+                                            search)['results']
+
+    except Exception as e:
+        msg = 'Error getting ' + name + ' in ' + resource + ': ' + \
+            error_message(e)
+        module.fail_json(msg=msg)
+    if len(results) > 0:
+        return results
+    else:
+        return None
+
+
+def single_element_from_name(resource, name, module, foreman_client,
+                             thin=False):
+    # Two elements are enough to know that the name is ambiguous
+    elements = elements_from_name(resource, name, module, foreman_client,
+                                  thin, limit=2)
+    if elements is None:
+        element = None
+    elif len(elements) == 1:
+        element = elements[0]
+    else:
+        msg = 'More that one item was found for ' + name + ' in ' + resource
+        raise ForemanMoreThanExpectedElements(msg)
+    return element
+
+
+def project_fields(element, fields):
+    """Returns only the given fields of element, all of them if None"""
+    if not fields or element is None:
+        return element
+    return dict((field, element[field]) for field in fields
+                if field in element)
+
+
+def id_from_name(resource, name, module, foreman_client):
+    cache = lookup_cache(module)
+    if cache is not None and resource not in UNCACHED_RESOURCES:
+        cached_id = cache.get(resource, name)
+        record_cache(foreman_client, 'lookup', cached_id is not None)
+        if cached_id is not None:
+            return cached_id
+    element = single_element_from_name(resource, name, module, foreman_client,
+                                       thin=True)
+    if element is None:
+        raise ForemanNotFoundElement('No element ' + name + ' in ' + resource)
+    if cache is not None and resource not in UNCACHED_RESOURCES:
+        cache.set(resource, name, element['id'])
+    return element['id']
+
+
+def _search_page(resource, search, page, per_page, foreman_client,
+                 thin=False, order=None):
+    options = [('page', page)] + _query_options(thin, per_page)
+    if order:
+        options.append(('order', order))
+    if resource in UNINDEXED_RESOURCES:
+        query = urlencode([('search', search)] + options)
+        return foreman_client.do_get('/api/' + resource, query)
+    return _index(foreman_client, resource, search, options)
+
+
+def search_elements(resource, search, module, foreman_client,
+                    per_page=PAGE_SIZE, thin=False, fields=None):
+    """Generator of all the elements of resource matching search.
+
+    Results are requested page by page as they are consumed, so only one
+    page is held in memory at a time. With thin only the id and name of the
+    elements are requested, fields restricts the keys of the elements
+    returned.
+    """
+    page = 1
+    while True:
+        try:
+            response = _search_page(resource, search, page, per_page,
+                                    foreman_client, thin)
+        except Exception as e:
+            msg = 'Error searching ' + resource + ': ' + error_message(e)
+            module.fail_json(msg=msg)
+        results = response['results']
+        for element in results:
+            yield project_fields(element, fields)
+        total = response.get('subtotal', response.get('total'))
+        if len(results) < per_page or \
+                (total is not None and page * per_page >= total):
+            break
+        page += 1
+
+
+def pages_after_id(resource, search, module, foreman_client,
+                   per_page=PAGE_SIZE, after_id=0, fields=None):
+    """Generator of the pages of elements of resource matching search.
+
+    Every page holds the next per_page elements by id, requested as the
+    ones with an id over the last one seen instead of by page number, so
+    no element is skipped or repeated when others are created or deleted
+    meanwhile, and a search can be resumed from the last id it returned.
+    """
+    while True:
+        query = 'id > %d' % after_id
+        if search:
+            query = '(' + search + ') and ' + query
+        try:
+            response = _search_page(resource, query, 1, per_page,
+                                    foreman_client, order='id ASC')
+        except Exception as e:
+            msg = 'Error searching ' + resource + ': ' + error_message(e)
+            module.fail_json(msg=msg)
+        results = response['results']
+        if not results:
+            break
+        after_id = max(element['id'] for element in results)
+        yield [project_fields(element, fields) for element in results]
+        if len(results) < per_page:
+            break
+
+
+def count_elements(resource, search, module, foreman_client):
+    """Returns the number of elements of resource matching search"""
+    try:
+        response = _search_page(resource, search, 1, 1, foreman_client,
+                                thin=True)
+    except Exception as e:
+        msg = 'Error searching ' + resource + ': ' + error_message(e)
+        module.fail_json(msg=msg)
+    return response.get('subtotal', response.get('total'))
+
+
+def _unique(names):
+    seen = set()
+    return [name for name in names
+            if not (name in seen or seen.add(name))]
+
+
+def elements_from_names(resource, names, module, foreman_client,
+                        thin=False):
+    """Resolves many names of the same resource at once.
+
+    A single search 'name ^ (a, b, ...)' is done for every BATCH_SIZE
+    names. Returns a dict with the list of elements found for each name,
+    the list is empty for missing names.
+    """
+    names = _unique(names)
+    found = dict((name, []) for name in names)
+    for start in range(0, len(names), BATCH_SIZE):
+        batch = names[start:start + BATCH_SIZE]
+        search = 'name ^ (' + ', '.join('"' + name + '"'
+                                        for name in batch) + ')'
+        for element in search_elements(resource, search, module,
+                                       foreman_client, thin=thin):
+            if element.get('name') in found:
+                found[element['name']].append(element)
+    return found
+
+
+def lookup_ids(resource, names, module, foreman_client):
+    """Resolves the ids of many names of resource at once.
+
+    Returns a tuple with a dict mapping the names found to their ids, the
+    list of missing names and the list of names matching more than one
+    element.
+    """
+    cache = lookup_cache(module)
+    use_cache = cache is not None and resource not in UNCACHED_RESOURCES
+    ids = {}
+    pending = []
+    for name in _unique(names):
+        cached_id = cache.get(resource, name) if use_cache else None
+        if use_cache:
+            record_cache(foreman_client, 'lookup', cached_id is not None)
+        if cached_id is None:
+            pending.append(name)
+        else:
+            ids[name] = cached_id
+    if not pending:
+        return ids, [], []
+    elements = elements_from_names(resource, pending, module,
+                                   foreman_client, thin=True)
+    missing = [name for name in pending if not elements[name]]
+    ambiguous = [name for name in pending if len(elements[name]) > 1]
+    resolved = dict((name, elements[name][0]['id']) for name in pending
+                    if len(elements[name]) == 1)
+    if use_cache and resolved:
+        cache.set_many(resource, resolved)
+    ids.update(resolved)
+    return ids, missing, ambiguous
+
+
+def ids_from_names(resource, names, module, foreman_client):
+    """Batch version of id_from_name, returns a dict mapping names to ids.
+
+    All the missing or ambiguous names are reported in the exception
+    raised, in their names attribute.
+    """
+    ids, missing, ambiguous = lookup_ids(resource, names, module,
+                                         foreman_client)
+    if ambiguous:
+        msg = 'More that one item was found for ' + ', '.join(ambiguous) + \
+            ' in ' + resource
+        raise ForemanMoreThanExpectedElements(msg, ambiguous)
+    if missing:
+        msg = 'No element ' + ', '.join(missing) + ' in ' + resource
+        raise ForemanNotFoundElement(msg, missing)
+    return ids
+
+
+def subnet_from_network(network, module, foreman_client):
+    subnets = subnet_index(module, foreman_client)
+    if subnets is not None:
+        subnet_id = subnets.find_network(network)
+        if subnet_id is None:
+            raise ForemanNotFoundElement("Network " + network + " not found")
+        return subnet_id
+    results = []
+    try:
+        search = 'network=' + '"' + network + '"'
+        results = _index(foreman_client, 'subnets', search,
+                         _query_options(True, 1))['results']
+    except Exception as e:
+        msg = 'Error getting ' + network + ' in networks: ' + \
+            error_message(e)
+        module.fail_json(msg=msg)
+    if len(results) > 0:
+        return results[0]['id']
+    else:
+        raise ForemanNotFoundElement("Network " + network + " not found")
+
+
+def subnet_from_ip(ip, module, foreman_client):
+    """Returns the id of the most specific subnet containing ip, if any"""
+    subnets = subnet_index(module, foreman_client, required=True)
+    return subnets.find(ip)
+
+
+def _ip_to_int(address):
+    if ':' in address:
+        family, bits = socket.AF_INET6, 128
+    else:
+        family, bits = socket.AF_INET, 32
+    packed = socket.inet_pton(family, address)
+    return family, bits, int(binascii.hexlify(packed), 16)
+
+
+def _prefix_mask(bits, prefix):
+    return ((1 << prefix) - 1) << (bits - prefix)
+
+
+class SubnetIndex(object):
+    """In memory index of the foreman subnets.
+
+    Finds the subnet of an ip address matching the longest prefix, trying
+    every prefix length known, longest first.
+    """
+
+    def __init__(self, subnets):
+        self.subnets = subnets
+        self._prefixes = {}
+        self._networks = {}
+        for subnet in subnets:
+            try:
+                self._add(subnet)
+            except (KeyError, TypeError, ValueError, socket.error):
+                # subnets without a valid network/mask can't be matched
+                pass
+
+    def _add(self, subnet):
+        family, bits, network = _ip_to_int(subnet['network'])
+        prefix = subnet.get('cidr')
+        if prefix is None:
+            prefix = bin(_ip_to_int(subnet['mask'])[2]).count('1')
+        prefix = int(prefix)
+        networks = self._prefixes.setdefault((family, prefix), {})
+        networks[network & _prefix_mask(bits, prefix)] = subnet['id']
+        self._networks.setdefault(subnet['network'], []).append(
+            (prefix, subnet['id']))
+
+    def find(self, ip):
+        try:
+            family, bits, address = _ip_to_int(ip)
+        except (TypeError, ValueError, socket.error):
+            return None
+        prefixes = sorted((prefix for prefix_family, prefix in self._prefixes
+                           if prefix_family == family), reverse=True)
+        for prefix in prefixes:
+            networks = self._prefixes[(family, prefix)]
+            subnet_id = networks.get(address & _prefix_mask(bits, prefix))
+            if subnet_id is not None:
+                return subnet_id
+        return None
+
+    def find_network(self, network):
+        # with several subnets with the same address, the most specific one
+        matches = sorted(self._networks.get(network, []), reverse=True)
+        if matches:
+            return matches[0][1]
+        return None
+
+
+# Fields of the subnets needed to build the index
+SUBNET_FIELDS = ['id', 'network', 'mask', 'cidr']
+
+_SUBNET_INDEXES = {}
+_SUBNET_INDEXES_LOCK = threading.Lock()
+
+
+def subnet_index(module, foreman_client, required=False):
+    """Returns the SubnetIndex of the foreman server of the module.
+
+    The index is built from a single paginated search of all the subnets,
+    and kept in memory and in lookup_cache_dir for lookup_cache_ttl
+    seconds. Returns None when the cache is disabled, unless required.
+    """
+    params = module.params
+    ttl = params.get('lookup_cache_ttl') or 0
+    cache_dir = params.get('lookup_cache_dir')
+    if (ttl <= 0 or not cache_dir) and not required:
+        return None
+    key = (params['url'], params['foreman_user'])
+    with _SUBNET_INDEXES_LOCK:
+        built, index = _SUBNET_INDEXES.get(key, (0, None))
+        if index is not None and (ttl <= 0 or time.time() - built <= ttl):
+            record_cache(foreman_client, 'subnets', True)
+            return index
+        path = None
+        if ttl > 0 and cache_dir:
+            digest = hashlib.sha1(('%s\n%s' % key).encode('utf-8'))
+            path = os.path.join(os.path.expanduser(cache_dir),
+                                'subnets-%s.json' % digest.hexdigest())
+            try:
+                with open(path) as cache_file:
+                    data = json.load(cache_file)
+                if time.time() - data['time'] <= ttl:
+                    index = SubnetIndex(data['subnets'])
+                    _SUBNET_INDEXES[key] = (data['time'], index)
+                    record_cache(foreman_client, 'subnets', True)
+                    return index
+            except (IOError, OSError, ValueError, KeyError, TypeError):
+                pass
+        record_cache(foreman_client, 'subnets', False)
+        subnets = list(search_elements('subnets', '', module, foreman_client,
+                                       fields=SUBNET_FIELDS))
+        now = time.time()
+        if path is not None:
+            try:
+                ensure_dir(os.path.dirname(path))
+                write_json(path, dict(time=now, subnets=subnets))
+            except (IOError, OSError, ValueError):
+                pass
+        index = SubnetIndex(subnets)
+        _SUBNET_INDEXES[key] = (now, index)
+        return index
+
+
+def invalidate_subnet_index(module):
+    params = module.params
+    key = (params['url'], params['foreman_user'])
+    with _SUBNET_INDEXES_LOCK:
+        if _SUBNET_INDEXES.pop(key, None) is None:
+            return False
+    cache_dir = params.get('lookup_cache_dir')
+    if cache_dir:
+        digest = hashlib.sha1(('%s\n%s' % key).encode('utf-8'))
+        try:
+            os.unlink(os.path.join(os.path.expanduser(cache_dir),
+                                   'subnets-%s.json' % digest.hexdigest()))
+        except OSError:
+            pass
+    return True
+
+
+def invalidate_served_lookups(module):
+    """Drops the cached ids used so far in this run.
+
+    Returns True if something was invalidated, so the caller knows that
+    resolving the names again may fix the error it got.
+    """
+    invalidated = invalidate_subnet_index(module)
+    cache = lookup_cache(module)
+    if cache is None or not cache.served:
+        return invalidated
+    cache.invalidate(cache.served)
+    return True
@@ -0,0 +1,90 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Argument specs of the foreman modules"""
+
+from ansible.module_utils.foreman_utils.common import DEFAULT_CACHE_DIR
+
+
+def foreman_argument_spec(**kwargs):
+    spec = dict(
+        url=dict(required=True),
+        endpoints=dict(required=False, type='list'),
+        foreman_user=dict(required=True),
+        foreman_password=dict(required=True, no_log=True),
+        lookup_cache_dir=dict(required=False, default=DEFAULT_CACHE_DIR),
+        lookup_cache_ttl=dict(required=False, type='int', default=3600),
+        lookup_cache_size=dict(required=False, type='int', default=4096),
+        api_cache_ttl=dict(required=False, type='int', default=86400),
+        http_cache=dict(required=False, type='bool', default=True),
+        http_cache_ttl=dict(required=False, type='int', default=30),
+        pool_size=dict(required=False, type='int', default=10),
+        adaptive_concurrency=dict(required=False, type='bool', default=True),
+        rate_limit=dict(required=False, type='float', default=0),
+        rate_burst=dict(required=False, type='int', default=10),
+        connect_timeout=dict(required=False, type='float', default=10),
+        read_timeout=dict(required=False, type='float', default=60),
+        retries=dict(required=False, type='int', default=3),
+        hedge_percentile=dict(required=False, type='float', default=0),
+        trace_file=dict(required=False),
+    )
+    spec.update(kwargs)
+    return spec
+
+
+def host_argument_spec():
+    """Options of foreman_host, shared with its action plugin"""
+    return foreman_argument_spec(
+        state=dict(default='present', choices=['absent', 'present']),
+        build=dict(default='false', choices=['true', 'false']),
+        name=dict(required=True),
+        ip=dict(required=False),
+        mac=dict(required=False),
+        organization_name=dict(required=True),
+        location_name=dict(required=True),
+        hostgroup_name=dict(required=False),
+        ptable_name=dict(required=False),
+        root_pass=dict(required=False),
+        host_parameters_attributes=dict(required=False),
+        interfaces_attributes=dict(required=False),
+        compute_resource=dict(required=False),
+        compute_profile=dict(required=False),
+        network=dict(required=False),
+        update=dict(required=False, type='bool', default=False),
+        infer_subnet=dict(required=False, type='bool', default=False),
+        journal=dict(required=False),
+        run_on_controller=dict(required=False, type='bool', default=True),
+    )
+
+
+def host_facts_argument_spec():
+    """Options of foreman_host_facts"""
+    return foreman_argument_spec(
+        name=dict(required=False),
+        names=dict(required=False, type='list'),
+        workers=dict(required=False, type='int', default=8),
+        fields=dict(required=False, type='list'),
+    )
+
+
+def host_power_argument_spec():
+    """Options of foreman_host_power, shared with its action plugin"""
+    return foreman_argument_spec(
+        name=dict(required=True),
+        power_action=dict(choices=['start', 'stop', 'poweroff', 'reboot',
+                                   'reset', 'state', 'on', 'off', 'soft',
+                                   'cycle'], required=True),
+        run_on_controller=dict(required=False, type='bool', default=True),
+    )
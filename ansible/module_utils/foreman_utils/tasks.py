@@ -0,0 +1,152 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Concurrent calls done by the modules"""
+
+from ansible.module_utils.foreman_utils.common import (ModuleExit,
+                                                       error_message)
+
+
+# Maximum number of requests sent in parallel to resolve names
+LOOKUP_WORKERS = 8
+
+
+def _thread_pool(size):
+    # imported on first use, multiprocessing is slow to import and most
+    # module runs never need a pool
+    from multiprocessing.pool import ThreadPool
+    return ThreadPool(size)
+
+
+class _DeferredFailure(Exception):
+
+    def __init__(self, kwargs):
+        super(_DeferredFailure, self).__init__(kwargs.get('msg'))
+        self.kwargs = kwargs
+
+
+class _WorkerModule(object):
+    """Proxy of the AnsibleModule used from worker threads.
+
+    fail_json can't exit from a worker thread, so the failure is raised
+    and reported by run_concurrently from the main thread instead.
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def fail_json(self, **kwargs):
+        raise _DeferredFailure(kwargs)
+
+
+def _run_task(task):
+    function, module, foreman_client = task
+    try:
+        return True, function(module, foreman_client)
+    except Exception as e:
+        return False, e
+
+
+def run_concurrently(module, foreman_client, functions,
+                     workers=LOOKUP_WORKERS):
+    """Calls every function(module, foreman_client) in a pool of threads.
+
+    Returns the results in the same order as functions. Errors are handled
+    as if the functions had been called one after another: the first one
+    in order is reported through module.fail_json or raised again.
+    """
+    if not functions:
+        return []
+    worker_module = _WorkerModule(module)
+    tasks = [(function, worker_module, foreman_client)
+             for function in functions]
+    if workers <= 1 or len(tasks) == 1:
+        outcomes = [_run_task(task) for task in tasks]
+    else:
+        pool = _thread_pool(min(workers, len(tasks)))
+        try:
+            outcomes = pool.map(_run_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    results = []
+    for succeeded, value in outcomes:
+        if succeeded:
+            results.append(value)
+        elif isinstance(value, _DeferredFailure):
+            module.fail_json(**value.kwargs)
+        else:
+            raise value
+    return results
+
+
+class HostModule(object):
+    """View of the module for one of the hosts of a bulk operation.
+
+    params are the module ones updated with the host ones, exit_json and
+    fail_json record the result of the host instead of exiting.
+    """
+
+    def __init__(self, module, params):
+        self._module = module
+        self.params = dict(module.params)
+        self.params.update(params)
+
+    def __getattr__(self, name):
+        return getattr(self._module, name)
+
+    def exit_json(self, **kwargs):
+        raise ModuleExit(kwargs)
+
+    def fail_json(self, **kwargs):
+        kwargs['failed'] = True
+        raise ModuleExit(kwargs)
+
+
+def _run_host_task(task):
+    function, module, foreman_client = task
+    try:
+        function(module, foreman_client)
+        result = dict(changed=False)
+    except ModuleExit as e:
+        result = e.result
+    except Exception as e:
+        result = dict(failed=True, msg=error_message(e))
+    result.setdefault('changed', False)
+    result['name'] = module.params['name']
+    return result
+
+
+def run_host_tasks(module, foreman_client, function, hosts,
+                   workers=LOOKUP_WORKERS):
+    """Calls function(host_module, foreman_client) for every host.
+
+    hosts is a list of dicts with the params of every host, the calls are
+    done in a pool of workers threads. Returns the list of results passed
+    to exit_json or fail_json by every host, in the same order as hosts.
+    """
+    tasks = [(function, HostModule(module, params), foreman_client)
+             for params in hosts]
+    if workers <= 1 or len(tasks) <= 1:
+        return [_run_host_task(task) for task in tasks]
+    pool = _thread_pool(min(workers, len(tasks)))
+    try:
+        return pool.map(_run_host_task, tasks)
+    finally:
+        pool.close()
+        pool.join()
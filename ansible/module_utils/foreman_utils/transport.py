@@ -0,0 +1,554 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Http transport of the foreman client: pooling, admission, retries"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+
+try:
+    from Queue import Empty, Queue
+except ImportError:
+    from queue import Empty, Queue
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:
+    HAS_FCNTL = False
+
+from ansible.module_utils.foreman_utils.common import (DEFAULT_CACHE_DIR,
+                                                       IDEMPOTENT_METHODS,
+                                                       RETRY_STATUSES,
+                                                       _percentile,
+                                                       _start_thread,
+                                                       ensure_dir)
+
+
+# Milliseconds waited before the first retry, doubled for every other one
+RETRY_WAIT = 250
+RETRY_MAX_WAIT = 8000
+
+# Number of latencies of the last GETs kept to compute the hedging delay,
+# and minimum number of them needed to hedge
+HEDGE_SAMPLES = 200
+HEDGE_MIN_SAMPLES = 20
+
+_ADAPTER_CLASSES = []
+
+
+def _pooled_adapter_class():
+    if not _ADAPTER_CLASSES:
+        from requests.adapters import HTTPAdapter
+        from requests.exceptions import ConnectionError, Timeout
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+        try:
+            from retrying import RetryError, Retrying
+        except ImportError:
+            Retrying = RetryError = None
+
+        def is_transient(error):
+            return isinstance(error, (ConnectionError, Timeout))
+
+        def is_retry_status(response):
+            return response.status_code in RETRY_STATUSES
+
+        def cached_response(request, entry):
+            response = Response()
+            response.status_code = 200
+            response.reason = 'OK'
+            response.headers = CaseInsensitiveDict()
+            if entry.get('content_type'):
+                response.headers['Content-Type'] = entry['content_type']
+            response._content = entry['body'].encode('utf-8')
+            response.encoding = 'utf-8'
+            response.url = request.url
+            response.request = request
+            return response
+
+        class PooledAdapter(HTTPAdapter):
+            """Transport adapter of the foreman client.
+
+            Counts the requests sent through it and admits them through
+            the scheduler, if any. Requests are sent with the connect
+            timeout, GETs with the read timeout too, replacing the ones of
+            the client. GETs failing with a transient error are retried
+            and the ones slower than hedge_percentile of the last GETs are
+            sent again, the first answer is used. GETs are answered from
+            response_cache, if any, see ResponseCache. Reads are sent to
+            the server picked by endpoints, if any, failing over to the
+            others, see EndpointSelector.
+            """
+
+            def __init__(self, *args, **kwargs):
+                super(PooledAdapter, self).__init__(*args, **kwargs)
+                self.requests = 0
+                self.scheduler = None
+                self.timeout = None
+                self.retries = 0
+                self.hedge_percentile = 0
+                self.metrics = None
+                self.response_cache = None
+                self.endpoints = None
+                self._count_lock = threading.Lock()
+                self._latencies = deque(maxlen=HEDGE_SAMPLES)
+
+            def _send_once(self, request, endpoint=None, **kwargs):
+                with self._count_lock:
+                    self.requests += 1
+                scheduler = self.scheduler
+                queued = start = time.time()
+                if scheduler is not None:
+                    start = scheduler.acquire()
+                status = error = None
+                size = 0
+                failed = False
+                try:
+                    response = super(PooledAdapter, self).send(request,
+                                                               **kwargs)
+                    status = response.status_code
+                    if not kwargs.get('stream'):
+                        size = len(response.content or b'')
+                    if request.method in IDEMPOTENT_METHODS and \
+                            status < 500:
+                        self._latencies.append(time.time() - start)
+                    return response
+                except Exception as e:
+                    error = type(e).__name__
+                    failed = is_transient(e)
+                    raise
+                finally:
+                    if scheduler is not None:
+                        scheduler.release(start, status)
+                    if endpoint is not None:
+                        self.endpoints.record(
+                            endpoint, time.time() - start,
+                            failed or status in RETRY_STATUSES)
+                    if self.metrics is not None:
+                        self.metrics.record(request.method,
+                                            request.path_url, status, size,
+                                            time.time() - start,
+                                            start - queued, error)
+
+            def _send_routed(self, request, **kwargs):
+                endpoints = self.endpoints
+                if endpoints is None or \
+                        request.method not in IDEMPOTENT_METHODS:
+                    return self._send_once(request, **kwargs)
+                tried = []
+                while True:
+                    endpoint = endpoints.choose(tried)
+                    tried.append(endpoint)
+                    last = endpoints.choose(tried) is None
+                    try:
+                        response = self._send_once(
+                            endpoints.route(request, endpoint),
+                            endpoint=endpoint, **kwargs)
+                    except Exception as e:
+                        if last or not is_transient(e):
+                            raise
+                        continue
+                    if last or not is_retry_status(response):
+                        return response
+                    response.close()
+
+            def _hedge_delay(self):
+                latencies = list(self._latencies)
+                if not self.hedge_percentile or \
+                        len(latencies) < HEDGE_MIN_SAMPLES:
+                    return None
+                return _percentile(latencies, self.hedge_percentile)
+
+            def _send_hedged(self, request, **kwargs):
+                delay = self._hedge_delay()
+                if delay is None or kwargs.get('stream'):
+                    return self._send_routed(request, **kwargs)
+                answers = Queue()
+
+                def attempt(prepared):
+                    try:
+                        answers.put((self._send_routed(prepared, **kwargs),
+                                     None))
+                    except Exception as e:
+                        answers.put((None, e))
+
+                _start_thread(attempt, request)
+                pending = 0
+                try:
+                    response, error = answers.get(timeout=delay)
+                except Empty:
+                    _start_thread(attempt, request.copy())
+                    pending = 1
+                    response, error = answers.get()
+                if error is not None and pending:
+                    # the other request may still succeed
+                    response, error = answers.get()
+                if error is not None:
+                    raise error
+                return response
+
+            def send(self, request, **kwargs):
+                if self.timeout:
+                    connect, read = self.timeout
+                    if read is None or \
+                            request.method not in IDEMPOTENT_METHODS:
+                        # writes keep the longer read timeout of the client,
+                        # creating a host in a compute resource takes minutes
+                        read = kwargs.get('timeout')
+                        if isinstance(read, tuple):
+                            read = read[1]
+                    kwargs['timeout'] = (connect, read)
+                cache = self.response_cache
+                if request.method not in IDEMPOTENT_METHODS:
+                    # may have been applied even if the answer was lost
+                    try:
+                        return self._send_once(request, **kwargs)
+                    finally:
+                        if cache is not None:
+                            cache.invalidate(request.url)
+                if cache is None or request.method != 'GET' or \
+                        not request.path_url.startswith('/api/') or \
+                        kwargs.get('stream'):
+                    return self._send_retried(request, **kwargs)
+                entry = cache.get(request.url)
+                if entry is not None and cache.is_fresh(entry):
+                    self._record_cache(True)
+                    return cached_response(request, entry)
+                if entry is not None:
+                    if entry.get('etag'):
+                        request.headers['If-None-Match'] = entry['etag']
+                    if entry.get('last_modified'):
+                        request.headers['If-Modified-Since'] = \
+                            entry['last_modified']
+                response = self._send_retried(request, **kwargs)
+                if response.status_code == 304 and entry is not None:
+                    self._record_cache(True)
+                    return cached_response(request, entry)
+                self._record_cache(False)
+                if response.status_code == 200:
+                    cache.set(request.url, response)
+                return response
+
+            def _record_cache(self, hit):
+                if self.metrics is not None:
+                    self.metrics.record_cache('http', hit)
+
+            def _send_retried(self, request, **kwargs):
+                if Retrying is None or self.retries <= 0:
+                    return self._send_hedged(request, **kwargs)
+                retrying = Retrying(stop_max_attempt_number=self.retries + 1,
+                                    wait_exponential_multiplier=RETRY_WAIT,
+                                    wait_exponential_max=RETRY_MAX_WAIT,
+                                    wait_jitter_max=RETRY_WAIT,
+                                    retry_on_exception=is_transient,
+                                    retry_on_result=is_retry_status)
+                try:
+                    return retrying.call(self._send_hedged, request,
+                                         **kwargs)
+                except RetryError as e:
+                    # still failing, return its last answer
+                    return e.last_attempt.get()
+
+        _ADAPTER_CLASSES.append(PooledAdapter)
+    return _ADAPTER_CLASSES[0]
+
+
+class AdaptiveConcurrency(object):
+    """AIMD limit of the requests to foreman in flight in the process.
+
+    The limit grows by one after every window of requests completed with
+    a healthy latency, up to maximum. It is halved, down to minimum, on
+    429 and 5xx responses, on connection errors and when the p95 latency
+    of a window exceeds LATENCY_FACTOR times the best one seen.
+    """
+
+    WINDOW = 20
+    LATENCY_FACTOR = 2.0
+    # the best p95 grows by this factor every window above it, so a server
+    # which stays slower becomes the new reference instead of keeping the
+    # limit at its minimum
+    BASELINE_DRIFT = 1.1
+
+    def __init__(self, maximum, minimum=1):
+        self.maximum = max(maximum, 1)
+        self.minimum = max(min(minimum, self.maximum), 1)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._latencies = []
+        self._best_p95 = None
+        self._decreased = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        return time.time()
+
+    def release(self, start, status):
+        with self._condition:
+            self.in_flight -= 1
+            if status is None or status == 429 or status >= 500:
+                self._decrease(start)
+            else:
+                self._latencies.append(time.time() - start)
+                if len(self._latencies) >= self.WINDOW:
+                    self._end_window(start)
+            self._condition.notify_all()
+
+    def _end_window(self, start):
+        p95 = _percentile(self._latencies, 95)
+        self._latencies = []
+        if self._best_p95 is None or p95 < self._best_p95:
+            self._best_p95 = p95
+        if p95 > self.LATENCY_FACTOR * self._best_p95:
+            self._best_p95 *= self.BASELINE_DRIFT
+            self._decrease(start)
+        else:
+            self.limit = min(self.limit + 1, self.maximum)
+
+    def _decrease(self, start):
+        # the requests already in flight when the limit was cut don't cut
+        # it again, a burst of errors only halves it once
+        if start < self._decreased:
+            return
+        self.limit = max(self.limit / 2, self.minimum)
+        self._decreased = time.time()
+        self._latencies = []
+
+
+class TokenBucket(object):
+    """Rate limit of the requests shared by all the processes using path.
+
+    The bucket gets rate tokens per second, up to burst, and every request
+    takes one. Its state is kept in path and updated under an exclusive
+    lock, so all the forks talking to the same server share the limit.
+    """
+
+    def __init__(self, path, rate, burst):
+        self.path = path
+        self.rate = float(rate)
+        self.burst = max(burst, 1)
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Takes a token, returns the seconds to wait if there was none"""
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                if HAS_FCNTL:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                now = time.time()
+                try:
+                    tokens, updated = [float(value) for value in
+                                       os.read(fd, 64).split()]
+                except ValueError:
+                    tokens, updated = self.burst, now
+                tokens = min(tokens + max(now - updated, 0) * self.rate,
+                             self.burst)
+                wait = 0
+                if tokens >= 1:
+                    tokens -= 1
+                else:
+                    wait = (1 - tokens) / self.rate
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, ('%f %f' % (tokens, now)).encode('ascii'))
+                return wait
+            finally:
+                os.close(fd)
+
+    def acquire(self):
+        wait = self._take()
+        while wait:
+            time.sleep(wait)
+            wait = self._take()
+
+
+class RequestScheduler(object):
+    """Admits the requests to foreman, see AdaptiveConcurrency and
+    TokenBucket. Either of them may be None."""
+
+    def __init__(self, concurrency=None, bucket=None):
+        self.concurrency = concurrency
+        self.bucket = bucket
+
+    def acquire(self):
+        start = time.time()
+        if self.concurrency is not None:
+            start = self.concurrency.acquire()
+        if self.bucket is not None:
+            self.bucket.acquire()
+            start = time.time()
+        return start
+
+    def release(self, start, status):
+        if self.concurrency is not None:
+            self.concurrency.release(start, status)
+
+
+class EndpointSelector(object):
+    """Picks the foreman server of every read among equivalent urls.
+
+    Requests are addressed to the first url, the primary one, where all
+    the writes are sent. Reads go to the healthy url with the lowest EWMA
+    of its latencies, the urls without latencies yet are tried first and
+    every PROBE_INTERVAL reads the url with the oldest latency is tried
+    again, so a server which became faster is noticed. A url failing with
+    a connection error, a timeout or an overloaded status is left aside
+    for COOLDOWN seconds, doubled on every consecutive failure.
+    """
+
+    ALPHA = 0.3
+    PROBE_INTERVAL = 20
+    COOLDOWN = 5.0
+    MAX_COOLDOWN = 60.0
+
+    def __init__(self, urls):
+        self.urls = []
+        for url in urls:
+            url = url.rstrip('/')
+            if url not in self.urls:
+                self.urls.append(url)
+        self.primary = self.urls[0]
+        self._latency = dict((url, None) for url in self.urls)
+        self._sampled = dict((url, 0) for url in self.urls)
+        self._failures = dict((url, 0) for url in self.urls)
+        self._down_until = dict((url, 0) for url in self.urls)
+        self._calls = dict((url, 0) for url in self.urls)
+        self._failed = dict((url, 0) for url in self.urls)
+        self._reads = 0
+        self._lock = threading.Lock()
+
+    def choose(self, exclude=()):
+        """Returns the url for the next read but the ones in exclude, the
+        one which recovers first if all of them are failing, None if all
+        of them are excluded."""
+        now = time.time()
+        with self._lock:
+            candidates = [url for url in self.urls if url not in exclude]
+            if not candidates:
+                return None
+            healthy = [url for url in candidates
+                       if self._down_until[url] <= now]
+            if not healthy:
+                return min(candidates, key=lambda url: self._down_until[url])
+            if not exclude:
+                self._reads += 1
+                if self._reads % self.PROBE_INTERVAL == 0:
+                    return min(healthy, key=lambda url: self._sampled[url])
+            return min(healthy, key=lambda url: (
+                self._latency[url] is not None, self._latency[url],
+                url != self.primary))
+
+    def route(self, request, url):
+        """Returns request sent to url instead of the primary one"""
+        if url == self.primary or not request.url.startswith(self.primary):
+            return request
+        routed = request.copy()
+        routed.url = url + request.url[len(self.primary):]
+        # the session cookie belongs to the primary server
+        routed.headers.pop('Cookie', None)
+        return routed
+
+    def record(self, url, latency, failed=False):
+        now = time.time()
+        with self._lock:
+            self._calls[url] += 1
+            if failed:
+                self._failed[url] += 1
+                self._failures[url] += 1
+                self._down_until[url] = now + min(
+                    self.COOLDOWN * 2 ** (self._failures[url] - 1),
+                    self.MAX_COOLDOWN)
+                return
+            self._failures[url] = 0
+            self._down_until[url] = 0
+            self._sampled[url] = now
+            if self._latency[url] is None:
+                self._latency[url] = latency
+            else:
+                self._latency[url] += self.ALPHA * (latency -
+                                                    self._latency[url])
+
+    def stats(self):
+        """Returns the reads, failures and latency of every url"""
+        now = time.time()
+        with self._lock:
+            return dict((url, dict(
+                calls=self._calls[url], failures=self._failed[url],
+                latency=(round(self._latency[url], 4)
+                         if self._latency[url] is not None else None),
+                healthy=self._down_until[url] <= now,
+                primary=url == self.primary)) for url in self.urls)
+
+
+def _request_scheduler(module, pool_size):
+    params = module.params
+    concurrency = bucket = None
+    if params.get('adaptive_concurrency'):
+        concurrency = AdaptiveConcurrency(pool_size)
+    rate = params.get('rate_limit')
+    if rate and rate > 0:
+        cache_dir = os.path.expanduser(params.get('lookup_cache_dir') or
+                                       DEFAULT_CACHE_DIR)
+        digest = hashlib.sha1(params['url'].encode('utf-8')).hexdigest()
+        try:
+            ensure_dir(cache_dir)
+            bucket = TokenBucket(os.path.join(cache_dir,
+                                              'ratelimit-%s' % digest),
+                                 rate, params.get('rate_burst') or 1)
+        except (IOError, OSError):
+            pass
+    if concurrency is None and bucket is None:
+        return None
+    return RequestScheduler(concurrency, bucket)
+
+
+def _configure_session(client, pool_size, scheduler=None, timeout=None,
+                       retries=0, hedge_percentile=0, metrics=None,
+                       response_cache=None, endpoints=None):
+    """Sets up the http session of the client for concurrent use.
+
+    All the requests to foreman go through a pool of up to pool_size
+    persistent connections, a request waits for a free connection instead
+    of opening one more. Responses are requested gzip compressed. The
+    requests are admitted by scheduler, if any, sent with timeout and
+    recorded in metrics, see PooledAdapter for retries,
+    hedge_percentile, response_cache and endpoints.
+    """
+    session = getattr(client, 'session', None)
+    if session is None:
+        return
+    adapter = _pooled_adapter_class()(pool_connections=4,
+                                      pool_maxsize=max(pool_size, 1),
+                                      pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+    session.headers['Connection'] = 'keep-alive'
+    adapter.scheduler = scheduler
+    adapter.timeout = timeout
+    adapter.retries = retries
+    adapter.hedge_percentile = hedge_percentile
+    adapter.metrics = metrics
+    adapter.response_cache = response_cache
+    adapter.endpoints = endpoints
+    client.pooled_adapter = adapter
@@ -17,11 +17,11 @@
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
 
-try:
-    from foreman.client import Foreman
-    HAS_REQS = True
-except ImportError:
-    HAS_REQS = False
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (ensure_host, error_message,
+                                                get_foreman_client,
+                                                has_foreman_client,
+                                                host_argument_spec)
 
 
 DOCUMENTATION = '''
@@ -110,6 +110,43 @@ options:
         - List of additional interfaces configuration. It must be a list of
           of dictionaries as defined in foreman API.
      required: false
+   infer_subnet:
+     description:
+        - Assign the host and every interface in interfaces_attributes to
+          the most specific foreman subnet containing their ip, unless
+          network or subnet_id are given. The subnets are indexed once and
+          cached in lookup_cache_dir, no request is needed per host.
+     required: false
+     default: false
+   update:
+     description:
+        - Update the host if it already exists. Only the organization,
+          location, hostgroup, partition table, subnet, ip, mac, parameters
+          and interfaces which differ from the host in foreman are changed,
+          parameters and interfaces not given are kept. Interfaces are
+          matched by mac or, without mac, by identifier and then by ip.
+          Nothing is changed if the host is already up to date.
+     required: false
+     default: false
+   journal:
+     description:
+        - File where the hosts created, updated or deleted and the ids
+          resolved from names are appended, on the host running the
+          module. The tasks of a run restarted with the same journal
+          report the hosts it records in the desired state as not
+          changed, without any request, and reuse its ids. All the
+          forks of a play can share it. Remove it, or use a new one, to
+          start a new run.
+     required: false
+   run_on_controller:
+     description:
+        - When the foreman action plugins are installed, run the task on
+          the ansible controller instead of copying the module to the
+          target host. Requires python-foreman on the controller, the task
+          falls back to the target host when it isn't available.
+     required: false
+     default: true
+extends_documentation_fragment: foreman
 requirements:
     - "python >= 2.7"
     - "python-foreman"
@@ -133,7 +170,8 @@ EXAMPLES = '''
     root_pass: "password"
     host_parameters_attributes: "[{'name': 'parameter', 'value': 'value'}]"
 
-# Create a new host vm1.example.com in foreman with a second NIC interface.
+# Create a new host vm1.example.com in foreman with a second NIC interface,
+# both of them in the subnets containing their ip addresses.
 #
 - foreman_host:
     state: present
@@ -149,6 +187,23 @@ EXAMPLES = '''
     root_pass: "password"
     interfaces_attributes: "[{'mac': '10:00:00:00:00:00',
                               'ip': '1.1.1.1', 'type': 'Nic::Managed' }]"
+    infer_subnet: true
+
+# Moves vm1.example.com to another hostgroup and changes one of its
+# parameters, without deleting and provisioning the host again:
+#
+- foreman_host:
+    state: present
+    update: true
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    organization_name: myorg
+    location_name: myloc
+    name: vm1.example.com
+    mac: 00:00:00:00:00:00
+    hostgroup_name: otherhostgroup
+    host_parameters_attributes: "[{'name': 'parameter', 'value': 'new'}]"
 
 # Deletes a host vm1.example.com in foreman:
 #
@@ -180,152 +235,19 @@ EXAMPLES = '''
 '''
 
 
-def _exit_hostvars(module, host, changed=True, result="success"):
-    name = module.params['name']
-    if host is None:
-        hostvars = {}
-    else:
-        hostvars = {"name": name, "id": host["id"], "ip": host["ip"]}
-    module.exit_json(
-        changed=changed, host=hostvars, result=result)
-
-
-def _delete_host(module, foreman_client):
-    name = module.params['name']
-    element = single_element_from_name('hosts', name, module,
-                                           foreman_client)
-    id = element["id"]
-    ip = element["ip"]
-    host = {"name": name, "id": id, "ip": ip}
-    try:
-        foreman_client.destroy_hosts(id)
-    except Exception as e:
-        module.fail_json(msg="Error in deleting host: %s" % e.message)
-    _exit_hostvars(module, host, changed=True)
-
-
-def _create_host(module, foreman_client):
-    params = module.params
-    args = {}
-    args['name'] = params['name']
-    args['build'] = params['build']
-    args['organization_id'] = id_from_name('organizations',
-                                           params['organization_name'],
-                                           module, foreman_client)
-    args['location_id'] = id_from_name('locations', params['location_name'],
-                                       module, foreman_client)
-
-    if params['hostgroup_name']:
-        args['mac'] = params['mac']
-
-    if params['hostgroup_name']:
-        args['hostgroup_id'] = id_from_name('hostgroups',
-                                            params['hostgroup_name'],
-                                            module, foreman_client)
-
-    if params['compute_resource']:
-        args['compute_resource_id'] = id_from_name('computeresources',
-                                                   params['compute_resource'],
-                                                   module, foreman_client)
-
-    if params['compute_profile']:
-        args['compute_profile_id'] = id_from_name('computeprofiles',
-                                                  params['compute_profile'],
-                                                  module, foreman_client)
-
-    if params['root_pass']:
-        args['root_pass'] = params['root_pass']
-
-    if params['ptable_name']:
-        args['ptable_id'] = id_from_name('ptables',
-                                         params['ptable_name'], module,
-                                         foreman_client)
-
-    if params['ip']:
-        args['ip'] = params['ip']
-
-    if params['interfaces_attributes']:
-        args['interfaces_attributes'] = eval(params['interfaces_attributes'])
-
-    if params['network']:
-        args['subnet_id'] = subnet_from_network(params['network'],
-                                                module, foreman_client)
-
-    try:
-        host = foreman_client.create_hosts(host=args)
-    except Exception as e:
-        module.fail_json(msg="Error creating host: %s" % e.message)
-
-    if params['host_parameters_attributes']:
-        hostparams = {}
-        hostparams['host_parameters_attributes'] = \
-            eval(params['host_parameters_attributes'])
-        try:
-            host = foreman_client.update_hosts(host=hostparams, id=host['id'])
-        except Exception as e:
-            module.fail_json(msg="Error creating host: %s" % e.message)
-    _exit_hostvars(module, host)
-
-
-def _get_host_state(module, foreman_client):
-    state = module.params['state']
-    host = single_element_from_name('hosts', module.params['name'],
-                                        module, foreman_client)
-    if host and state == 'present':
-        _exit_hostvars(module, host, changed=False)
-    if host and state == 'absent':
-        return True
-    if state == 'absent':
-        _exit_hostvars(module, host=None, changed=False)
-    return True
-
-
 def main():
 
-    argument_spec = dict(
-        state=dict(default='present', choices=['absent', 'present']),
-        url=dict(required=True),
-        foreman_user=dict(required=True),
-        foreman_password=dict(required=True, no_log=True),
-        build=dict(default='false', choices=['true', 'false']),
-        name=dict(required=True),
-        ip=dict(required=False),
-        mac=dict(required=False),
-        organization_name=dict(required=True),
-        location_name=dict(required=True),
-        hostgroup_name=dict(required=False),
-        ptable_name=dict(required=False),
-        root_pass=dict(required=False),
-        host_parameters_attributes=dict(required=False),
-        interfaces_attributes=dict(required=False),
-        compute_resource=dict(required=False),
-        compute_profile=dict(required=False),
-        network=dict(required=False),
-    )
-    module = AnsibleModule(argument_spec)
+    module = AnsibleModule(host_argument_spec())
 
-    if not HAS_REQS:
+    if not has_foreman_client():
         module.fail_json(msg='python-foreman is required for this module')
 
-    state = module.params['state']
-
     try:
-        host_params = dict(module.params)
-        foreman_client = Foreman(host_params['url'],
-                                 (host_params['foreman_user'],
-                                 host_params['foreman_password']),
-                                 api_version=2)
-
-        if state == 'present':
-            _get_host_state(module, foreman_client)
-            _create_host(module, foreman_client)
-        elif state == 'absent':
-            _get_host_state(module, foreman_client)
-            _delete_host(module, foreman_client)
+        foreman_client = get_foreman_client(module)
+        ensure_host(module, foreman_client)
     except ValueError as e:
-        module.fail_json(msg=e.message)
+        module.fail_json(msg=error_message(e))
+
 
-from ansible.module_utils.basic import *
-from ansible.module_utils.foreman_utils import *
 if __name__ == '__main__':
     main()
@@ -17,11 +17,13 @@
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
 
-try:
-    from foreman.client import Foreman
-    HAS_FOREMAN_CLIENT = True
-except ImportError:
-    HAS_FOREMAN_CLIENT = False
+from functools import partial
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (
+    ForemanMoreThanExpectedElements, ForemanNotFoundElement,
+    elements_from_names, error_message, exit_host_facts, get_foreman_client,
+    has_foreman_client, host_facts, host_facts_argument_spec, run_host_tasks)
 
 
 DOCUMENTATION = '''
@@ -32,6 +34,8 @@ version_added: "2.0"
 author: "Alfredo Moralejo (amoralej)"
 description:
    - Add foreman_host and foreman_status facts for node
+   - When a list of names is given, adds a foreman_hosts fact with the
+     foreman_host and foreman_status of every host
 options:
    url:
      description:
@@ -47,8 +51,24 @@ options:
      required: true
    name:
      description:
-        - Name of the host in foreman
-     required: true
+        - Name of the host in foreman. Required unless names is given.
+     required: false
+   names:
+     description:
+        - List with the names of hosts in foreman. All the hosts are
+          searched at once and their status fetched concurrently.
+     required: false
+   workers:
+     description:
+        - Number of host status fetched concurrently when names is given
+     required: false
+     default: 8
+   fields:
+     description:
+        - List of the fields of the host returned in the foreman_host fact,
+          all of them by default.
+     required: false
+extends_documentation_fragment: foreman
 requirements:
     - "python >= 2.7"
     - "python-foreman"
@@ -65,44 +85,78 @@ EXAMPLES = '''
 - debug:
     var: foreman_host
 
+# Get only the id, ip and hostgroup of vm1.example.com
+#
+- foreman_host_facts:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    name: vm1.example.com
+    fields:
+      - id
+      - ip
+      - hostgroup_name
+
+# Get foreman facts for all the hosts in a group
+#
+- foreman_host_facts:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    names: "{{ groups['compute'] }}"
+  run_once: true
+- debug:
+    var: foreman_hosts['vm1.example.com'].foreman_status
+
 '''
 
 
-def _get_host_status(module, foreman_client):
-    id = id_from_name('hosts', module.params['name'], module, foreman_client)
-    status = foreman_client.do_get("/api/hosts/" + str(id) + "/status", "")
-    return status
+def _host_facts(module, foreman_client, hosts):
+    name = module.params['name']
+    elements = hosts.get(name)
+    if not elements:
+        raise ForemanNotFoundElement('No element ' + name + ' in hosts')
+    if len(elements) > 1:
+        msg = 'More that one item was found for ' + name + ' in hosts'
+        raise ForemanMoreThanExpectedElements(msg, [name])
+    module.exit_json(**host_facts(module, foreman_client, elements[0]))
+
+
+def _hosts_facts(module, foreman_client):
+    names = module.params['names']
+    hosts = elements_from_names('hosts', names, module, foreman_client)
+    results = run_host_tasks(module, foreman_client,
+                             partial(_host_facts, hosts=hosts),
+                             [dict(name=name) for name in names],
+                             module.params['workers'])
+    failed = [result['name'] for result in results if result.get('failed')]
+    if failed:
+        module.fail_json(msg='Error in hosts: %s' % ', '.join(failed),
+                         hosts=results)
+    facts = {}
+    for result in results:
+        facts[result['name']] = dict(foreman_host=result['foreman_host'],
+                                     foreman_status=result['foreman_status'])
+    module.exit_json(changed=False, ansible_facts=dict(foreman_hosts=facts))
 
 
 def main():
 
-    argument_spec = dict(
-        url=dict(required=True),
-        foreman_user=dict(required=True),
-        foreman_password=dict(required=True, no_log=True),
-        name=dict(required=True),
-    )
-    module = AnsibleModule(argument_spec)
+    module = AnsibleModule(host_facts_argument_spec(),
+                           mutually_exclusive=[['name', 'names']],
+                           required_one_of=[['name', 'names']])
 
-    if not HAS_FOREMAN_CLIENT:
+    if not has_foreman_client():
         module.fail_json(msg='python-foreman is required for this module')
 
     try:
-        host_params = dict(module.params)
-        foreman_client = Foreman(host_params['url'],
-                                 (host_params['foreman_user'],
-                                 host_params['foreman_password']),
-                                 api_version=2)
-        host = single_element_from_name('hosts', module.params['name'],
-                                        module, foreman_client)
-        status = _get_host_status(module, foreman_client)
-        module.exit_json(changed=False, ansible_facts=dict(
-            foreman_host=host, foreman_status=status))
+        foreman_client = get_foreman_client(module)
+        if module.params['names']:
+            _hosts_facts(module, foreman_client)
+        exit_host_facts(module, foreman_client)
     except Exception as e:
-        module.fail_json(msg=e.message)
+        module.fail_json(msg=error_message(e))
 
 
-from ansible.module_utils.basic import *
-from ansible.module_utils.foreman_utils import *
 if __name__ == '__main__':
     main()
@@ -16,12 +16,12 @@
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
 
-try:
-    from foreman.client import Foreman
-    from retrying import retry
-    HAS_REQS = True
-except ImportError:
-    HAS_REQS = False
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (apply_power_action,
+                                                error_message,
+                                                get_foreman_client,
+                                                has_foreman_client,
+                                                host_power_argument_spec)
 
 
 DOCUMENTATION = '''
@@ -57,10 +57,18 @@ options:
           Valid actions are (on/start), (off/stop), (soft/reboot),
           (cycle/reset)
      required: true
+   run_on_controller:
+     description:
+        - When the foreman action plugins are installed, run the task on
+          the ansible controller instead of copying the module to the
+          target host. Requires python-foreman on the controller, the task
+          falls back to the target host when it isn't available.
+     required: false
+     default: true
+extends_documentation_fragment: foreman
 requirements:
     - "python >= 2.7"
     - "python-foreman"
-    - "retrying"
 '''
 
 EXAMPLES = '''
@@ -77,41 +85,18 @@ EXAMPLES = '''
 '''
 
 
-def _power_action(module, foreman_client):
-        host_id = id_from_name('hosts', module.params['name'],
-                               module, foreman_client)
-        url = '/api/hosts/' + str(host_id) + '/power?power_action=' \
-            + module.params['power_action']
-        host = foreman_client.do_put(url, '')
-        module.exit_json(changed='true', result='success')
-
-
 def main():
-    argument_spec = dict(
-        url=dict(required=True),
-        foreman_user=dict(required=True),
-        foreman_password=dict(required=True, no_log=True),
-        name=dict(required=True),
-        power_action=dict(choices=['start', 'stop', 'poweroff', 'reboot',
-                                   'reset', 'state', 'on', 'off', 'soft',
-                                   'cycle'], required=True),
-    )
-    module = AnsibleModule(argument_spec)
+    module = AnsibleModule(host_power_argument_spec())
 
-    if not HAS_REQS:
-        module.fail_json(msg='python-foreman and retrying required for module')
+    if not has_foreman_client():
+        module.fail_json(msg='python-foreman is required for this module')
 
     try:
-        host_params = dict(module.params)
-        foreman_client = Foreman(host_params['url'],
-                                 (host_params['foreman_user'],
-                                 host_params['foreman_password']),
-                                 api_version=2)
-        power = _power_action(module, foreman_client)
+        foreman_client = get_foreman_client(module)
+        apply_power_action(module, foreman_client)
     except Exception as e:
-        module.fail_json(msg=e.message)
+        module.fail_json(msg=error_message(e))
+
 
-from ansible.module_utils.basic import *
-from ansible.module_utils.foreman_utils import *
 if __name__ == '__main__':
     main()
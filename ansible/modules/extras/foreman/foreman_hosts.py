@@ -0,0 +1,452 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from functools import partial
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (
+    HOST_REFERENCES, ForemanMoreThanExpectedElements, ForemanNotFoundElement,
+    check_host_state, create_host, delete_host, elements_from_names,
+    error_message, foreman_argument_spec, get_foreman_client,
+    has_foreman_client, id_from_name, journaled_references, lookup_ids,
+    operation_journal, pages_after_id, run_host_tasks, skip_journaled_host,
+    subnet_from_network, update_host)
+
+
+DOCUMENTATION = '''
+---
+module: foreman_hosts
+short_description: Create/Delete many hosts in foreman at once
+version_added: "2.0"
+author: "Alfredo Moralejo (amoralej)"
+description:
+   - Create or Remove a list of hosts in foreman in a single task. The
+     organizations, locations, hostgroups and other objects referenced by
+     the hosts are resolved once for all of them and the hosts are created
+     or deleted by a pool of concurrent workers.
+   - With exclusive, the hosts given are all the hosts wanted in the
+     organization, location and/or hostgroup given. All the hosts there
+     are fetched at once, a page at a time, and the ones not given are
+     deleted before the missing ones are created.
+options:
+   url:
+     description:
+        - URL of foreman (or satellite server)
+     required: true
+   foreman_user:
+     description:
+        -user to access foreman (or satellite server)
+     required: true
+   foreman_pass:
+     description:
+        -password to access foreman (or satellite server)
+     required: true
+   hosts:
+     description:
+        - List of hosts. Every host is a dictionary with the same options
+          as the foreman_host module, only name is required. The options
+          not given for a host take the value of the module option with the
+          same name.
+     required: true
+   state:
+     description:
+        - The default desired status for the hosts, present or absent
+     required: false
+     default: present
+   organization_name:
+     description:
+        - The default name of the organization assigned to the hosts
+     required: false
+   location_name:
+     description:
+        - The default name of the location assigned to the hosts
+     required: false
+   hostgroup_name:
+     description:
+        - The default name of the hostgroup assigned to the hosts
+     required: false
+   build:
+     description:
+        - Set hosts in build mode
+     default: false
+   ptable_name:
+     description:
+        - The default name of the partition table assigned to the hosts
+     required: false
+   root_pass:
+     description:
+        - The default password of root user applied in kickstarting
+     required: false
+   network:
+     description:
+        - The default direction of the subnet to assign as primary.
+     required: false
+   compute_resource:
+     description:
+        - The default compute resource name used to deploy the hosts
+     required: false
+   compute_profile:
+     description:
+        - The default compute profile name used to deploy the hosts if
+          deployng from compute resource
+     required: false
+   host_parameters_attributes:
+     description:
+        - Default list of parameters to set for the hosts, as in
+          foreman_host
+     required: false
+   update:
+     description:
+        - Update the hosts which already exist, as in foreman_host
+     required: false
+     default: false
+   infer_subnet:
+     description:
+        - Assign the hosts to the subnets containing their ip, as in
+          foreman_host
+     required: false
+     default: false
+   workers:
+     description:
+        - Number of hosts created or deleted concurrently. It shouldn't be
+          greater than pool_size, workers would wait for a free connection.
+     required: false
+     default: 8
+   journal:
+     description:
+        - File where the hosts done and the ids resolved from names are
+          appended as in foreman_host. When the module is run again with
+          the same journal, only the hosts not recorded in it are looked
+          up and created or deleted.
+     required: false
+   exclusive:
+     description:
+        - Reconciles the scope given by the module options
+          organization_name, location_name and hostgroup_name (at least
+          one of them is required) with hosts. The hosts in that scope not
+          listed in hosts are deleted. The result reports the names of
+          the hosts created, updated, deleted and unchanged in reconciled.
+          A host created with the mac of a deleted one reports its name in
+          replaced.
+     required: false
+     default: false
+extends_documentation_fragment: foreman
+requirements:
+    - "python >= 2.7"
+    - "python-foreman"
+'''
+
+EXAMPLES = '''
+# Creates three hosts in the same organization, location and hostgroup
+#
+- foreman_hosts:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    organization_name: myorg
+    location_name: myloc
+    hostgroup_name: myhostgroup
+    root_pass: "password"
+    hosts:
+      - name: vm1.example.com
+        mac: 00:00:00:00:00:01
+        ip: 192.168.100.3
+      - name: vm2.example.com
+        mac: 00:00:00:00:00:02
+        ip: 192.168.100.4
+      - name: vm3.example.com
+        mac: 00:00:00:00:00:03
+        ip: 192.168.100.5
+        hostgroup_name: otherhostgroup
+
+# Deletes a list of hosts
+#
+- foreman_hosts:
+    state: absent
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    hosts:
+      - name: vm1.example.com
+      - name: vm2.example.com
+
+# Leaves exactly these two hosts in the hostgroup web of myorg/myloc,
+# deleting any other host in it
+#
+- foreman_hosts:
+    exclusive: true
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    organization_name: myorg
+    location_name: myloc
+    hostgroup_name: web
+    hosts:
+      - name: web1.example.com
+        mac: 00:00:00:00:00:01
+      - name: web2.example.com
+        mac: 00:00:00:00:00:02
+
+'''
+
+HOST_OPTIONS = ['name', 'mac', 'ip', 'state', 'build', 'organization_name',
+                'location_name', 'hostgroup_name', 'ptable_name', 'root_pass',
+                'network', 'compute_resource', 'compute_profile',
+                'host_parameters_attributes', 'interfaces_attributes',
+                'update', 'infer_subnet']
+
+# Module options giving the scope of an exclusive run, with their resource
+# and the field of the hosts searched
+SCOPE_OPTIONS = [('organization_name', 'organizations', 'organization_id'),
+                 ('location_name', 'locations', 'location_id'),
+                 ('hostgroup_name', 'hostgroups', 'hostgroup_id')]
+# Fields of the hosts of the scope needed to reconcile them
+SCOPE_FIELDS = ['id', 'name', 'ip', 'mac']
+
+
+def _hide_passwords(module):
+    # root_pass is no_log as a module option but not inside hosts, keep
+    # the ones of every host out of the results and invocation
+    for host in module.params['hosts']:
+        if isinstance(host, dict) and host.get('root_pass'):
+            module.no_log_values.add(str(host['root_pass']))
+
+
+def _hosts_params(module):
+    hosts = []
+    names = set()
+    for host in module.params['hosts']:
+        if not isinstance(host, dict) or not host.get('name'):
+            module.fail_json(msg='Every host must be a dictionary with a name')
+        unknown = sorted(set(host) - set(HOST_OPTIONS))
+        if unknown:
+            module.fail_json(msg='Unknown options for host %s: %s' %
+                             (host['name'], ', '.join(unknown)))
+        if host['name'] in names:
+            module.fail_json(msg='Host %s is duplicated' % host['name'])
+        names.add(host['name'])
+        params = dict((option, module.params.get(option))
+                      for option in HOST_OPTIONS)
+        params.update(host)
+        params['update'] = module.boolean(params['update'])
+        params['infer_subnet'] = module.boolean(params['infer_subnet'])
+        if params['state'] not in ('present', 'absent'):
+            module.fail_json(msg='Invalid state for host %s: %s' %
+                             (host['name'], params['state']))
+        if params['state'] == 'present' and \
+                not (params['organization_name'] and
+                     params['location_name']):
+            module.fail_json(msg='organization_name and location_name are '
+                                 'required to create host %s' % host['name'])
+        hosts.append(params)
+    return hosts
+
+
+def _resolve_references(module, foreman_client, hosts):
+    # Only the names that can be resolved are returned, the hosts
+    # referencing the others fail with the same error as foreman_host.
+    # The ones in the journal of an earlier run aren't looked up again.
+    to_create = [host for host in hosts if host['state'] == 'present']
+    resolved = journaled_references(module)
+    for arg, param, resource in HOST_REFERENCES:
+        names = [host[param] for host in to_create
+                 if host[param] and (resource, host[param]) not in resolved]
+        if not names:
+            continue
+        ids, missing, ambiguous = lookup_ids(resource, names, module,
+                                             foreman_client)
+        for name, id in ids.items():
+            resolved[(resource, name)] = id
+    for host in to_create:
+        network = host['network']
+        if not network or ('network', network) in resolved:
+            continue
+        try:
+            resolved[('network', network)] = \
+                subnet_from_network(network, module, foreman_client)
+        except ForemanNotFoundElement:
+            pass
+    journal = operation_journal(module)
+    if journal is not None:
+        journal.record_resolved(resolved)
+    return resolved
+
+
+def _scope_search(module, foreman_client, resolved):
+    conditions = []
+    for option, resource, field in SCOPE_OPTIONS:
+        name = module.params[option]
+        if not name:
+            continue
+        id = resolved.get((resource, name))
+        if id is None:
+            id = id_from_name(resource, name, module, foreman_client)
+        conditions.append('%s = %s' % (field, id))
+    return ' and '.join(conditions)
+
+
+def _reconcile(module, foreman_client, resolved, hosts, pending):
+    """Diffs hosts with the hosts of the scope of the module.
+
+    The hosts of the scope are fetched once and indexed by name and mac.
+    Returns the existing hosts by name, as elements_from_names does, the
+    params to delete the hosts of the scope not in hosts, and the names
+    of the deleted hosts whose mac is taken by a host to create.
+    """
+    search = _scope_search(module, foreman_client, resolved)
+    by_name = {}
+    by_mac = {}
+    for page in pages_after_id('hosts', search, module, foreman_client,
+                               fields=SCOPE_FIELDS):
+        for element in page:
+            by_name.setdefault(element['name'], []).append(element)
+            if element.get('mac'):
+                by_mac[element['mac'].lower()] = element
+    names = set(host['name'] for host in hosts)
+    stale = [dict(name=name, state='absent') for name in sorted(by_name)
+             if name not in names]
+    # the hosts to create may exist out of the scope, only they are
+    # looked up by name
+    existing = dict(by_name)
+    existing.update(elements_from_names(
+        'hosts', [host['name'] for host in pending
+                  if host['name'] not in by_name], module, foreman_client))
+    replaced = {}
+    for host in pending:
+        holder = by_mac.get(str(host['mac'] or '').lower())
+        if host['state'] == 'present' and holder is not None and \
+                holder['name'] not in names and not existing[host['name']]:
+            replaced[host['name']] = holder['name']
+    return existing, stale, replaced
+
+
+def _reconciled(hosts, results):
+    reconciled = dict(created=[], updated=[], deleted=[], unchanged=[])
+    for host, result in zip(hosts, results):
+        if result.get('failed'):
+            continue
+        if not result['changed']:
+            reconciled['unchanged'].append(host['name'])
+        elif host['state'] == 'absent':
+            reconciled['deleted'].append(host['name'])
+        elif 'updated' in result:
+            reconciled['updated'].append(host['name'])
+        else:
+            reconciled['created'].append(host['name'])
+    return reconciled
+
+
+def _apply_host_state(module, foreman_client, resolved, existing):
+    skip_journaled_host(module)
+    name = module.params['name']
+    elements = existing.get(name, [])
+    if len(elements) > 1:
+        msg = 'More that one item was found for ' + name + ' in hosts'
+        raise ForemanMoreThanExpectedElements(msg, [name])
+    host = elements[0] if elements else None
+    check_host_state(module, host)
+    if module.params['state'] == 'present':
+        if host:
+            update_host(module, foreman_client, host, resolved)
+        create_host(module, foreman_client, resolved)
+    else:
+        delete_host(module, foreman_client, host)
+
+
+def main():
+
+    argument_spec = foreman_argument_spec(
+        hosts=dict(required=True, type='list'),
+        state=dict(default='present', choices=['absent', 'present']),
+        build=dict(default='false', choices=['true', 'false']),
+        organization_name=dict(required=False),
+        location_name=dict(required=False),
+        hostgroup_name=dict(required=False),
+        ptable_name=dict(required=False),
+        root_pass=dict(required=False, no_log=True),
+        host_parameters_attributes=dict(required=False),
+        compute_resource=dict(required=False),
+        compute_profile=dict(required=False),
+        network=dict(required=False),
+        update=dict(required=False, type='bool', default=False),
+        infer_subnet=dict(required=False, type='bool', default=False),
+        workers=dict(required=False, type='int', default=8),
+        journal=dict(required=False),
+        exclusive=dict(required=False, type='bool', default=False),
+    )
+    module = AnsibleModule(argument_spec)
+    _hide_passwords(module)
+
+    if not has_foreman_client():
+        module.fail_json(msg='python-foreman is required for this module')
+
+    exclusive = module.params['exclusive']
+    if exclusive and not any(module.params[option]
+                             for option, _, _ in SCOPE_OPTIONS):
+        module.fail_json(msg='organization_name, location_name or '
+                             'hostgroup_name is required with exclusive')
+
+    hosts = _hosts_params(module)
+    journal = operation_journal(module)
+    # the hosts done by an earlier run aren't looked up again
+    pending = [host for host in hosts if journal is None or
+               journal.host(host['name'], host['state']) is None]
+
+    try:
+        foreman_client = get_foreman_client(module)
+
+        resolved = _resolve_references(module, foreman_client, pending)
+        stale = []
+        replaced = {}
+        if exclusive:
+            existing, stale, replaced = _reconcile(module, foreman_client,
+                                                   resolved, hosts, pending)
+        else:
+            existing = elements_from_names('hosts',
+                                           [host['name'] for host in pending],
+                                           module, foreman_client)
+        apply_host_state = partial(_apply_host_state, resolved=resolved,
+                                   existing=existing)
+        # the hosts left out are deleted first, freeing their macs and
+        # ips for the hosts created
+        results = run_host_tasks(module, foreman_client, apply_host_state,
+                                 stale, module.params['workers'])
+        results.extend(run_host_tasks(module, foreman_client,
+                                      apply_host_state, hosts,
+                                      module.params['workers']))
+    except (ValueError, ForemanNotFoundElement,
+            ForemanMoreThanExpectedElements) as e:
+        module.fail_json(msg=error_message(e))
+
+    for result in results:
+        if result['name'] in replaced and result['changed']:
+            result['replaced'] = replaced[result['name']]
+    extra = {}
+    if exclusive:
+        extra['reconciled'] = _reconciled(stale + hosts, results)
+    changed = any(result['changed'] for result in results)
+    failed = [result['name'] for result in results if result.get('failed')]
+    if failed:
+        module.fail_json(msg='Error in hosts: %s' % ', '.join(failed),
+                         changed=changed, hosts=results, **extra)
+    module.exit_json(changed=changed, hosts=results, **extra)
+
+
+if __name__ == '__main__':
+    main()
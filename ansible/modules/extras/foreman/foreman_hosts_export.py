@@ -0,0 +1,305 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+from functools import partial
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (error_message,
+                                                foreman_argument_spec,
+                                                get_foreman_client,
+                                                has_foreman_client,
+                                                pages_after_id, project_fields,
+                                                run_concurrently, string_types,
+                                                write_json)
+
+
+DOCUMENTATION = '''
+---
+module: foreman_hosts_export
+short_description: Exports foreman hosts to a local file
+version_added: "2.0"
+author: "Alfredo Moralejo (amoralej)"
+description:
+   - Writes every host matching a search to a file on the host running
+     the module, as JSON lines or CSV. Hosts are requested and written a
+     page at a time, so the memory used doesn't grow with the number of
+     hosts, optionally adding the status and parameters of every host of
+     the page, fetched concurrently.
+   - The hosts are written to <path>.part, which replaces the file once
+     the export is complete unless both are identical, so the task is only
+     changed when the file is. The progress is saved in <path>.state after
+     every page, an export which was interrupted continues from the last
+     page written when run again with the same options.
+options:
+   url:
+     description:
+        - URL of foreman (or satellite server)
+     required: true
+   foreman_user:
+     description:
+        -user to access foreman (or satellite server)
+     required: true
+   foreman_pass:
+     description:
+        -password to access foreman (or satellite server)
+     required: true
+   path:
+     description:
+        - File where the hosts are written
+     required: true
+   format:
+     description:
+        - json writes a JSON document per host and line, csv a line per
+          host with the fields as columns
+     required: false
+     default: json
+     choices: [ "json", "csv" ]
+   search:
+     description:
+        - Foreman search of the hosts exported, all of them by default
+     required: false
+   fields:
+     description:
+        - List of the fields of every host written, all of them by default.
+          The columns of csv are the fields of the first host when not
+          given.
+     required: false
+   status:
+     description:
+        - Adds the foreman_status of every host
+     required: false
+     default: false
+   parameters:
+     description:
+        - Adds the parameters of every host, as a dict of their values
+     required: false
+     default: false
+   workers:
+     description:
+        - Number of hosts whose status or parameters are fetched
+          concurrently
+     required: false
+     default: 8
+   per_page:
+     description:
+        - Number of hosts requested and written at once
+     required: false
+     default: 100
+   resume:
+     description:
+        - Continues an interrupted export from its last page, when false
+          the file is always written from the start
+     required: false
+     default: true
+extends_documentation_fragment: foreman
+requirements:
+    - "python >= 2.7"
+    - "python-foreman"
+'''
+
+EXAMPLES = '''
+# Exports all the hosts of an organization with their status
+#
+- foreman_hosts_export:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    path: /var/tmp/hosts.jsonl
+    search: organization = myorg
+    status: true
+    parameters: true
+  delegate_to: localhost
+  run_once: true
+
+# Exports the name, ip and mac of every host as csv
+#
+- foreman_hosts_export:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    path: /var/tmp/hosts.csv
+    format: csv
+    fields:
+      - name
+      - ip
+      - mac
+  delegate_to: localhost
+  run_once: true
+
+'''
+
+# Options which must not change to resume an export
+RESUME_OPTIONS = ['search', 'format', 'fields', 'status', 'parameters']
+
+
+def _host_details(module, foreman_client, host):
+    """Returns the status and parameters of host asked by the module"""
+    details = {}
+    if module.params['status']:
+        details['foreman_status'] = foreman_client.do_get(
+            '/api/hosts/' + str(host['id']) + '/status', '')
+    if module.params['parameters']:
+        element = foreman_client.do_get('/api/hosts/' + str(host['id']), '')
+        details['parameters'] = dict(
+            (parameter['name'], parameter['value'])
+            for parameter in element.get('parameters') or [])
+    return details
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        value = str(value).lower()
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, sort_keys=True)
+    elif not isinstance(value, string_types):
+        value = str(value)
+    if any(char in value for char in ',"\r\n'):
+        value = '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _csv_line(values):
+    return ','.join(_csv_value(value) for value in values) + '\n'
+
+
+def _json_line(host):
+    return json.dumps(host, sort_keys=True) + '\n'
+
+
+def _read_state(module, state_path):
+    if not module.params['resume'] or not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+    except ValueError:
+        return None
+    if any(state.get(option) != module.params[option]
+           for option in RESUME_OPTIONS):
+        return None
+    return state
+
+
+def _replace(module, part_path, path):
+    """Moves the export written to part_path to path, returns whether path
+    changed. An export identical to the existing file is dropped."""
+    if os.path.exists(path) and \
+            module.sha1(part_path) == module.sha1(path):
+        os.unlink(part_path)
+        return False
+    module.atomic_move(part_path, path)
+    return True
+
+
+def _export(module, foreman_client):
+    path = os.path.abspath(module.params['path'])
+    part_path = path + '.part'
+    state_path = path + '.state'
+    state = _read_state(module, state_path)
+    resumed = state is not None and os.path.exists(part_path)
+    if not resumed:
+        state = dict((option, module.params[option])
+                     for option in RESUME_OPTIONS)
+        state.update(last_id=0, offset=0, hosts=0, pages=0, columns=None)
+    resumed_hosts = state['hosts'] if resumed else 0
+
+    pages = pages_after_id('hosts', module.params['search'], module,
+                           foreman_client,
+                           per_page=module.params['per_page'],
+                           after_id=state['last_id'])
+    enrich = module.params['status'] or module.params['parameters']
+    with open(part_path, 'r+b' if resumed else 'wb') as export_file:
+        # anything after the last page saved was written by an
+        # interrupted run, it's written again
+        export_file.seek(state['offset'])
+        export_file.truncate()
+        if not resumed and module.params['format'] == 'csv' and \
+                module.params['fields']:
+            state['columns'] = list(module.params['fields'])
+            if module.params['status']:
+                state['columns'].append('foreman_status')
+            if module.params['parameters']:
+                state['columns'].append('parameters')
+            export_file.write(_csv_line(state['columns']).encode('utf-8'))
+        for page in pages:
+            hosts = [project_fields(host, module.params['fields'])
+                     for host in page]
+            if enrich:
+                details = run_concurrently(
+                    module, foreman_client,
+                    [partial(_host_details, host=host) for host in page],
+                    module.params['workers'])
+                for host, host_details in zip(hosts, details):
+                    host.update(host_details)
+            if module.params['format'] == 'csv':
+                lines = []
+                if state['columns'] is None:
+                    state['columns'] = sorted(hosts[0])
+                    lines.append(_csv_line(state['columns']))
+                lines.extend(_csv_line([host.get(column)
+                                        for column in state['columns']])
+                             for host in hosts)
+            else:
+                lines = [_json_line(host) for host in hosts]
+            export_file.write(''.join(lines).encode('utf-8'))
+            export_file.flush()
+            os.fsync(export_file.fileno())
+            state['last_id'] = max(host['id'] for host in page)
+            state['offset'] = export_file.tell()
+            state['hosts'] += len(page)
+            state['pages'] += 1
+            write_json(state_path, state)
+    changed = _replace(module, part_path, path)
+    if os.path.exists(state_path):
+        os.unlink(state_path)
+    return dict(changed=changed, path=path, hosts=state['hosts'],
+                pages=state['pages'], resumed=resumed,
+                resumed_hosts=resumed_hosts)
+
+
+def main():
+    argument_spec = foreman_argument_spec(
+        path=dict(required=True),
+        format=dict(required=False, default='json', choices=['json', 'csv']),
+        search=dict(required=False, default=''),
+        fields=dict(required=False, type='list'),
+        status=dict(required=False, type='bool', default=False),
+        parameters=dict(required=False, type='bool', default=False),
+        workers=dict(required=False, type='int', default=8),
+        per_page=dict(required=False, type='int', default=100),
+        resume=dict(required=False, type='bool', default=True),
+    )
+    module = AnsibleModule(argument_spec)
+
+    if not has_foreman_client():
+        module.fail_json(msg='python-foreman is required for this module')
+
+    try:
+        foreman_client = get_foreman_client(module)
+        result = _export(module, foreman_client)
+    except Exception as e:
+        module.fail_json(msg=error_message(e))
+    module.exit_json(**result)
+
+
+if __name__ == '__main__':
+    main()
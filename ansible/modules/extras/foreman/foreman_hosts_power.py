@@ -0,0 +1,198 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import time
+from functools import partial
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (
+    POWER_STATES, ForemanMoreThanExpectedElements, ForemanNotFoundElement,
+    error_message, foreman_argument_spec, get_foreman_client,
+    has_foreman_client, lookup_ids, power_action, power_state, run_host_tasks)
+
+
+DOCUMENTATION = '''
+---
+module: foreman_hosts_power
+short_description: Applies a power action to a list of foreman hosts
+version_added: "2.0"
+author: "Alfredo Moralejo (amoralej)"
+description:
+   - Applies a power action to a list of foreman hosts concurrently and
+     optionally waits until all of them reach the resulting power state.
+     This only can be applied to hosts that support power actions, as managed
+     through compute resources or bare metal with IPMI configured in foreman
+options:
+   url:
+     description:
+        - URL of foreman (or satellite server)
+     required: true
+   foreman_user:
+     description:
+        -user to access foreman (or satellite server)
+     required: true
+   foreman_pass:
+     description:
+        -password to access foreman (or satellite server)
+     required: true
+   names:
+     description:
+        - List with the names of the hosts
+     required: true
+   power_action:
+     description:
+        - The action to perform.
+          Valid actions are (on/start), (off/stop), (soft/reboot),
+          (cycle/reset)
+     required: true
+   workers:
+     description:
+        - Number of power actions sent concurrently
+     required: false
+     default: 8
+   wait:
+     description:
+        - Wait until all the hosts are powered on (after on, reboot or reset
+          actions) or off (after off actions).
+     required: false
+     default: false
+   wait_timeout:
+     description:
+        - Seconds to wait for the hosts to reach their power state, the
+          hosts not reaching it are reported as failed.
+     required: false
+     default: 300
+extends_documentation_fragment: foreman
+requirements:
+    - "python >= 2.7"
+    - "python-foreman"
+'''
+
+EXAMPLES = '''
+# Power cycle a cluster and wait until all its nodes are on again
+#
+- foreman_hosts_power:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    power_action: cycle
+    wait: true
+    names:
+      - node1.example.com
+      - node2.example.com
+      - node3.example.com
+
+'''
+
+# Maximum seconds between two checks of the power state of the hosts
+MAX_POLL_INTERVAL = 16
+
+
+def _dispatch(module, foreman_client, ids, ambiguous):
+    name = module.params['name']
+    if name in ambiguous:
+        msg = 'More that one item was found for ' + name + ' in hosts'
+        raise ForemanMoreThanExpectedElements(msg, [name])
+    if name not in ids:
+        raise ForemanNotFoundElement('No element ' + name + ' in hosts')
+    action = module.params['power_action']
+    start = time.time()
+    try:
+        power = power_action(foreman_client, ids[name], action)
+    except Exception as e:
+        module.fail_json(msg='Error applying power action: %s' %
+                         error_message(e))
+    module.exit_json(changed=action != 'state', result='success',
+                     id=ids[name], power=power.get('power'), start=start,
+                     action_time=time.time() - start)
+
+
+def _query_state(module, foreman_client):
+    module.exit_json(power=power_state(foreman_client, module.params['id']))
+
+
+def _wait_for_state(module, foreman_client, results, state):
+    deadline = time.time() + module.params['wait_timeout']
+    pending = [result for result in results if not result.get('failed')]
+    interval = 1
+    while pending:
+        states = run_host_tasks(module, foreman_client, _query_state,
+                                [dict(name=result['name'], id=result['id'])
+                                 for result in pending],
+                                module.params['workers'])
+        now = time.time()
+        waiting = []
+        for result, current in zip(pending, states):
+            if current.get('power') == state:
+                result['power'] = state
+                result['wait_time'] = now - result['start']
+            else:
+                waiting.append(result)
+        pending = waiting
+        if not pending or now >= deadline:
+            break
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 2, MAX_POLL_INTERVAL)
+    for result in pending:
+        result['failed'] = True
+        result['msg'] = 'Timeout waiting for power state %s' % state
+
+
+def main():
+    argument_spec = foreman_argument_spec(
+        names=dict(required=True, type='list'),
+        power_action=dict(choices=['start', 'stop', 'poweroff', 'reboot',
+                                   'reset', 'state', 'on', 'off', 'soft',
+                                   'cycle'], required=True),
+        workers=dict(required=False, type='int', default=8),
+        wait=dict(required=False, type='bool', default=False),
+        wait_timeout=dict(required=False, type='int', default=300),
+    )
+    module = AnsibleModule(argument_spec)
+
+    if not has_foreman_client():
+        module.fail_json(msg='python-foreman is required for this module')
+
+    names = module.params['names']
+    try:
+        foreman_client = get_foreman_client(module)
+        ids, missing, ambiguous = lookup_ids('hosts', names, module,
+                                             foreman_client)
+        results = run_host_tasks(module, foreman_client,
+                                 partial(_dispatch, ids=ids,
+                                         ambiguous=ambiguous),
+                                 [dict(name=name) for name in names],
+                                 module.params['workers'])
+        state = POWER_STATES.get(module.params['power_action'])
+        if module.params['wait'] and state:
+            _wait_for_state(module, foreman_client, results, state)
+    except Exception as e:
+        module.fail_json(msg=error_message(e))
+
+    for result in results:
+        result.pop('start', None)
+    changed = any(result['changed'] for result in results)
+    failed = [result['name'] for result in results if result.get('failed')]
+    if failed:
+        module.fail_json(msg='Error in hosts: %s' % ', '.join(failed),
+                         changed=changed, hosts=results)
+    module.exit_json(changed=changed, hosts=results)
+
+
+if __name__ == '__main__':
+    main()
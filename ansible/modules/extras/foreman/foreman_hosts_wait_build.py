@@ -0,0 +1,256 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import calendar
+import re
+import time
+from datetime import datetime, timedelta
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.foreman_utils import (error_message,
+                                                foreman_argument_spec,
+                                                get_foreman_client,
+                                                has_foreman_client, lookup_ids,
+                                                search_elements)
+
+
+DOCUMENTATION = '''
+---
+module: foreman_hosts_wait_build
+short_description: Waits until a list of foreman hosts finish their build
+version_added: "2.0"
+author: "Alfredo Moralejo (amoralej)"
+description:
+   - Waits until the given hosts are no longer in build mode, as after
+     creating them with foreman_host or foreman_hosts with build or in a
+     compute resource. All the hosts still in build are checked with a
+     single search every poll, instead of polling every host. The interval
+     between polls grows while no host finishes.
+options:
+   url:
+     description:
+        - URL of foreman (or satellite server)
+     required: true
+   foreman_user:
+     description:
+        -user to access foreman (or satellite server)
+     required: true
+   foreman_pass:
+     description:
+        -password to access foreman (or satellite server)
+     required: true
+   ids:
+     description:
+        - List with the ids of the hosts, as returned in host.id by
+          foreman_host and foreman_hosts. Either ids or names is required.
+     required: false
+   names:
+     description:
+        - List with the names of the hosts
+     required: false
+   timeout:
+     description:
+        - Seconds to wait for the hosts to finish their build, the hosts
+          still in build are reported as failed.
+     required: false
+     default: 3600
+   poll_interval:
+     description:
+        - Seconds between two checks of the hosts, it doubles while no host
+          finishes, up to 60.
+     required: false
+     default: 5
+extends_documentation_fragment: foreman
+requirements:
+    - "python >= 2.7"
+    - "python-foreman"
+'''
+
+EXAMPLES = '''
+# Creates some hosts and waits until all of them are installed
+#
+- foreman_hosts:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    organization_name: myorg
+    location_name: myloc
+    hostgroup_name: myhostgroup
+    build: "true"
+    hosts:
+      - name: vm1.example.com
+        mac: 00:00:00:00:00:01
+      - name: vm2.example.com
+        mac: 00:00:00:00:00:02
+  register: created
+
+- foreman_hosts_wait_build:
+    url: https://mysat.example.com
+    foreman_user: admin
+    foreman_password: pass
+    ids: "{{ created.hosts | map(attribute='host.id') | list }}"
+    timeout: 7200
+
+'''
+
+# Maximum seconds between two checks of the hosts in build
+MAX_POLL_INTERVAL = 60
+# Maximum number of ids searched in a single request
+ID_BATCH_SIZE = 200
+# Fields of the hosts which finished their build needed to report them
+HOST_FIELDS = ['id', 'name', 'build', 'created_at', 'installed_at']
+
+TIMESTAMP = re.compile(r'^(\d{4}-\d\d-\d\d)[T ](\d\d:\d\d:\d\d)(\.\d+)?\s*'
+                       r'(Z|UTC|[+-]\d\d:?\d\d)?$')
+
+
+def _parse_time(value):
+    """Returns the epoch of a timestamp given by foreman, None if unknown"""
+    match = TIMESTAMP.match(value or '')
+    if not match:
+        return None
+    date, hour, fraction, zone = match.groups()
+    moment = datetime.strptime(date + ' ' + hour, '%Y-%m-%d %H:%M:%S')
+    if zone and zone[0] in '+-':
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[-2:]))
+        moment = moment - offset if zone[0] == '+' else moment + offset
+    return calendar.timegm(moment.timetuple()) + float(fraction or 0)
+
+
+def _batches(ids):
+    ids = sorted(ids)
+    return [ids[start:start + ID_BATCH_SIZE]
+            for start in range(0, len(ids), ID_BATCH_SIZE)]
+
+
+def _id_search(ids):
+    return 'id ^ (' + ', '.join(str(id) for id in ids) + ')'
+
+
+def _building(module, foreman_client, ids):
+    """Returns the ids of the hosts still in build"""
+    building = set()
+    for batch in _batches(ids):
+        for element in search_elements('hosts',
+                                       'build = true and ' + _id_search(batch),
+                                       module, foreman_client,
+                                       per_page=len(batch), thin=True):
+            building.add(element['id'])
+    return building
+
+
+def _hosts_by_id(module, foreman_client, ids):
+    hosts = {}
+    for batch in _batches(ids):
+        for element in search_elements('hosts', _id_search(batch), module,
+                                       foreman_client, per_page=len(batch),
+                                       fields=HOST_FIELDS):
+            hosts[element['id']] = element
+    return hosts
+
+
+def _finish(result, host, wait_time):
+    if host is None:
+        result['failed'] = True
+        result['msg'] = 'Host was deleted during its build'
+        return
+    result['name'] = host.get('name')
+    result['finished'] = True
+    result['wait_time'] = round(wait_time, 3)
+    created_at = _parse_time(host.get('created_at'))
+    installed_at = _parse_time(host.get('installed_at'))
+    if created_at is not None and installed_at is not None:
+        result['build_time'] = round(installed_at - created_at, 3)
+
+
+def _wait_for_build(module, foreman_client, results):
+    start = time.time()
+    deadline = start + module.params['timeout']
+    interval = module.params['poll_interval']
+    pending = set(results)
+    while pending:
+        building = _building(module, foreman_client, pending)
+        finished = pending - building
+        now = time.time()
+        if finished:
+            hosts = _hosts_by_id(module, foreman_client, finished)
+            for id in finished:
+                _finish(results[id], hosts.get(id), now - start)
+            interval = module.params['poll_interval']
+        else:
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+        pending = building & pending
+        if not pending or now >= deadline:
+            break
+        time.sleep(min(interval, deadline - now))
+    for id in pending:
+        results[id]['failed'] = True
+        results[id]['msg'] = 'Timeout waiting for the build to finish'
+
+
+def main():
+    argument_spec = foreman_argument_spec(
+        ids=dict(required=False, type='list'),
+        names=dict(required=False, type='list'),
+        timeout=dict(required=False, type='int', default=3600),
+        poll_interval=dict(required=False, type='int', default=5),
+    )
+    module = AnsibleModule(argument_spec,
+                           mutually_exclusive=[['ids', 'names']],
+                           required_one_of=[['ids', 'names']])
+
+    if not has_foreman_client():
+        module.fail_json(msg='python-foreman is required for this module')
+
+    hosts = []
+    try:
+        foreman_client = get_foreman_client(module)
+        if module.params['names']:
+            names = module.params['names']
+            ids, missing, ambiguous = lookup_ids('hosts', names, module,
+                                                 foreman_client)
+            for name in names:
+                host = dict(name=name, finished=False, changed=False)
+                if name in ambiguous:
+                    host.update(failed=True, msg='More that one item was '
+                                'found for ' + name + ' in hosts')
+                elif name not in ids:
+                    host.update(failed=True,
+                                msg='No element ' + name + ' in hosts')
+                else:
+                    host['id'] = ids[name]
+                hosts.append(host)
+        else:
+            hosts = [dict(id=int(id), finished=False, changed=False)
+                     for id in module.params['ids']]
+        results = dict((host['id'], host) for host in hosts
+                       if not host.get('failed'))
+        _wait_for_build(module, foreman_client, results)
+    except Exception as e:
+        module.fail_json(msg=error_message(e))
+
+    failed = [str(host.get('name') or host.get('id')) for host in hosts
+              if host.get('failed')]
+    if failed:
+        module.fail_json(msg='Error in hosts: %s' % ', '.join(failed),
+                         changed=False, hosts=hosts)
+    module.exit_json(changed=False, hosts=hosts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from ansible.module_utils.foreman_utils import (ModuleExit, PluginModule,
+                                                ensure_host, error_message,
+                                                get_foreman_client,
+                                                has_foreman_client,
+                                                host_argument_spec)
+from ansible.plugins.action import ActionBase
+
+
+class ForemanAction(ActionBase):
+    """Runs a foreman module on the controller.
+
+    The task talks to foreman from the controller process, with the client
+    shared by the tasks run in the same process, instead of copying the
+    module to the target host and starting python there. The lookups are
+    shared with the other forks through the on-disk caches. In check mode
+    the module is executed as usual, so its own check mode handling
+    applies and nothing is changed in foreman.
+    """
+
+    TRANSFERS_FILES = False
+
+    # Set by every action: the module run on the target host when the task
+    # isn't run on the controller, the function returning its argument spec
+    # and the one doing its work, exiting through the module
+    module_name = None
+    argument_spec = None
+    runner = None
+
+    def _run_module(self, module):
+        foreman_client = get_foreman_client(module, shared=True)
+        try:
+            self.runner(module, foreman_client)
+        except ModuleExit:
+            raise
+        except Exception as e:
+            module.fail_json(msg=error_message(e))
+        module.exit_json(changed=False)
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ForemanAction, self).run(tmp, task_vars)
+        args = dict(self._task.args)
+        try:
+            module = PluginModule(args, self.argument_spec())
+            if has_foreman_client() and \
+                    module.params['run_on_controller'] and \
+                    not self._task.check_mode:
+                self._run_module(module)
+        except ModuleExit as e:
+            result.update(e.result)
+            return result
+        args.pop('run_on_controller', None)
+        result.update(self._execute_module(module_name=self.module_name,
+                                           module_args=args,
+                                           task_vars=task_vars))
+        return result
+
+
+class ActionModule(ForemanAction):
+
+    module_name = 'foreman_host'
+    argument_spec = staticmethod(host_argument_spec)
+    runner = staticmethod(ensure_host)
@@ -0,0 +1,26 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from ansible.module_utils.foreman_utils import (apply_power_action,
+                                                host_power_argument_spec)
+from ansible.plugins.action.foreman_host import ForemanAction
+
+
+class ActionModule(ForemanAction):
+
+    module_name = 'foreman_host_power'
+    argument_spec = staticmethod(host_power_argument_spec)
+    runner = staticmethod(apply_power_action)
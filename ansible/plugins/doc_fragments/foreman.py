@@ -0,0 +1,138 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+class ModuleDocFragment(object):
+
+    # Options shared by all the foreman modules, keep them in sync with
+    # ansible/utils/module_docs_fragments/foreman.py for ansible < 2.8
+    DOCUMENTATION = '''
+options:
+   endpoints:
+     description:
+        - List of the URLs of other foreman servers equivalent to url, as
+          the members of a cluster or replicas behind different load
+          balancers. Reads are sent to the one answering faster, and to
+          the next one when it fails to connect, times out or is
+          overloaded. Writes are always sent to url. The reads, failures
+          and latency of every server are reported in
+          foreman_metrics.servers.
+     required: false
+   lookup_cache_dir:
+     description:
+        - Directory where the ids resolved from names (organizations,
+          locations, hostgroups, ...) are cached. The cache is shared by
+          all the forks running against the same foreman server and user.
+     required: false
+     default: ~/.cache/ansible-foreman
+   lookup_cache_ttl:
+     description:
+        - Seconds a resolved id is kept in the lookup cache. Set it to 0 to
+          disable the cache.
+     required: false
+     default: 3600
+   lookup_cache_size:
+     description:
+        - Maximum number of entries kept in the lookup cache, the oldest
+          ones are evicted first.
+     required: false
+     default: 4096
+   api_cache_ttl:
+     description:
+        - Seconds the foreman version of the server is cached in
+          lookup_cache_dir, so the client can be built without asking the
+          server for it. The api definitions of every foreman version are
+          cached by python-foreman itself. Set it to 0 to disable the
+          cache.
+     required: false
+     default: 86400
+   http_cache:
+     description:
+        - Caches the answers of foreman to GET requests in
+          lookup_cache_dir. The ones with an ETag or Last-Modified are
+          requested again conditionally and not transferred if they didn't
+          change.
+     required: false
+     default: true
+   http_cache_ttl:
+     description:
+        - Seconds the answers without ETag nor Last-Modified are used
+          without asking foreman again, never for hosts. Set it to 0 to
+          only cache the answers which can be validated.
+     required: false
+     default: 30
+   pool_size:
+     description:
+        - Maximum number of persistent connections to foreman kept open
+          and shared by all the requests of the task.
+     required: false
+     default: 10
+   adaptive_concurrency:
+     description:
+        - Adapt the number of requests in flight to the health of foreman,
+          up to pool_size. It is halved when foreman answers with 429 or
+          5xx errors or its latency doubles, and grows again while the
+          latency is healthy.
+     required: false
+     default: true
+   rate_limit:
+     description:
+        - Maximum number of requests per second sent to the foreman server
+          by all the tasks running on the same machine, shared through a
+          lock file in lookup_cache_dir. 0 means no limit.
+     required: false
+     default: 0
+   rate_burst:
+     description:
+        - Number of requests which can be sent at once over rate_limit
+          after a while without requests.
+     required: false
+     default: 10
+   connect_timeout:
+     description:
+        - Seconds to wait for a connection to foreman. 0 waits forever.
+     required: false
+     default: 10
+   read_timeout:
+     description:
+        - Seconds to wait for foreman to answer a GET request. Requests
+          changing foreman keep the longer timeouts of python-foreman, as
+          creating hosts in some compute resources takes minutes. 0 keeps
+          the python-foreman timeout.
+     required: false
+     default: 60
+   retries:
+     description:
+        - Number of times a GET request is sent again after a connection
+          error, a timeout or a 429, 502, 503 or 504 answer, waiting
+          exponentially longer between tries. Requires the retrying python
+          library. Requests changing foreman are never sent again, a host
+          is only created again after checking it doesn't exist.
+     required: false
+     default: 3
+   hedge_percentile:
+     description:
+        - Send a GET request again when it takes longer than this
+          percentile of the latencies of the last GET requests, and use the
+          first answer. 0 disables it.
+     required: false
+     default: 0
+   trace_file:
+     description:
+        - File where every request to foreman is appended as a json line,
+          with its method, endpoint, resource, status, bytes and time.
+          Many tasks can share the file to trace a whole playbook run.
+     required: false
+'''
@@ -0,0 +1,222 @@
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+
+DOCUMENTATION = '''
+    name: foreman_inventory
+    plugin_type: inventory
+    short_description: Inventory of the hosts in foreman
+    author: "Alfredo Moralejo (amoralej)"
+    description:
+        - Gets the hosts from foreman (or satellite server) page by page and
+          groups them by hostgroup, location and organization.
+        - The hosts are cached on disk, later runs only fetch the hosts
+          updated since the last one.
+        - The inventory file name must end with foreman.yml or foreman.yaml
+    options:
+      plugin:
+        description: token that ensures this is a source file for the plugin.
+        required: true
+        choices: ['foreman_inventory']
+      url:
+        description: URL of foreman (or satellite server)
+        required: true
+        env:
+          - name: FOREMAN_URL
+      foreman_user:
+        description: user to access foreman (or satellite server)
+        required: true
+        env:
+          - name: FOREMAN_USER
+      foreman_password:
+        description: password to access foreman (or satellite server)
+        required: true
+        env:
+          - name: FOREMAN_PASSWORD
+      search:
+        description: Only include the hosts matching this foreman search
+        default: ''
+      group_prefix:
+        description: Prefix of the names of the groups created
+        default: foreman_
+      host_cache:
+        description:
+          - Keep the hosts in a cache and only fetch the hosts updated
+            since the last run. The whole inventory is fetched again when
+            the cache is flushed.
+        type: boolean
+        default: true
+      cache_dir:
+        description: Directory where the hosts are cached
+        default: ~/.cache/ansible-foreman
+'''
+
+EXAMPLES = '''
+# foreman.yml, enable the plugin in ansible.cfg:
+#   [inventory]
+#   enable_plugins = foreman_inventory
+plugin: foreman_inventory
+url: https://mysat.example.com
+foreman_user: admin
+foreman_password: pass
+search: 'os = RedHat'
+'''
+
+import hashlib
+import json
+import os
+import re
+
+from ansible.errors import AnsibleParserError
+from ansible.module_utils.foreman_utils import (BATCH_SIZE, ModuleExit,
+                                                PluginModule, ensure_dir,
+                                                get_foreman_client,
+                                                search_elements, write_json)
+from ansible.plugins.inventory import BaseInventoryPlugin
+
+# Fields of every host kept in the cache
+HOST_FIELDS = ['id', 'name', 'ip', 'mac', 'hostgroup_name', 'hostgroup_title',
+               'location_name', 'organization_name', 'operatingsystem_name',
+               'environment_name', 'updated_at']
+
+# Host fields used to group the hosts, and the name of their groups
+GROUP_FIELDS = [('hostgroup', ('hostgroup_title', 'hostgroup_name')),
+                ('location', ('location_name',)),
+                ('organization', ('organization_name',))]
+
+
+class InventoryCache(object):
+    """Hosts of a foreman server kept on disk between inventory runs"""
+
+    def __init__(self, cache_dir, url, user):
+        digest = hashlib.sha1(('%s\n%s' % (url, user)).encode('utf-8'))
+        self.path = os.path.join(os.path.expanduser(cache_dir),
+                                 'inventory-%s.json' % digest.hexdigest())
+
+    def load(self):
+        try:
+            with open(self.path) as cache_file:
+                data = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or 'hosts' not in data:
+            return None
+        return data
+
+    def store(self, data):
+        try:
+            ensure_dir(os.path.dirname(self.path))
+            write_json(self.path, data)
+        except (IOError, OSError, ValueError):
+            pass
+
+
+class InventoryModule(BaseInventoryPlugin):
+
+    NAME = 'foreman_inventory'
+
+    def verify_file(self, path):
+        return super(InventoryModule, self).verify_file(path) and \
+            path.endswith(('foreman.yml', 'foreman.yaml'))
+
+    def _sync(self, module, foreman_client, data):
+        """Updates data with the hosts changed since its last update"""
+        hosts = data['hosts']
+        search = self.get_option('search')
+        since = data.get('last_update')
+        query = search
+        if since:
+            query = 'updated_at >= "%s"' % since
+            if search:
+                query = '(%s) and %s' % (search, query)
+        latest = since
+        for element in search_elements('hosts', query, module,
+                                       foreman_client, fields=HOST_FIELDS):
+            hosts[str(element['id'])] = element
+            updated_at = element.get('updated_at')
+            if updated_at and (latest is None or updated_at > latest):
+                latest = updated_at
+        # Deleted hosts don't show up when searching the updated ones, the
+        # ids of all the hosts are checked with a thin search, a count
+        # would miss a host deleted while another one was created. Hosts
+        # missed by the search of the updated ones, as when the clock of
+        # foreman went back, are fetched by id.
+        if since:
+            ids = set(str(element['id']) for element in
+                      search_elements('hosts', search, module,
+                                      foreman_client, thin=True))
+            for id in list(hosts):
+                if id not in ids:
+                    del hosts[id]
+            missing = sorted(ids - set(hosts), key=int)
+            for start in range(0, len(missing), BATCH_SIZE):
+                batch = missing[start:start + BATCH_SIZE]
+                query = 'id ^ (%s)' % ','.join(batch)
+                for element in search_elements('hosts', query, module,
+                                               foreman_client,
+                                               fields=HOST_FIELDS):
+                    hosts[str(element['id'])] = element
+        data['last_update'] = latest
+
+    def _group_name(self, kind, value):
+        name = '%s%s_%s' % (self.get_option('group_prefix'), kind, value)
+        return re.sub(r'[^A-Za-z0-9_]', '_', name).lower()
+
+    def _populate(self, hosts):
+        for host in hosts.values():
+            name = host['name']
+            self.inventory.add_host(name)
+            for field in HOST_FIELDS:
+                self.inventory.set_variable(name, 'foreman_' + field,
+                                            host.get(field))
+            for kind, fields in GROUP_FIELDS:
+                value = next((host[field] for field in fields
+                              if host.get(field)), None)
+                if value:
+                    group = self._group_name(kind, value)
+                    self.inventory.add_group(group)
+                    self.inventory.add_child(group, name)
+
+    def parse(self, inventory, loader, path, cache=True):
+        super(InventoryModule, self).parse(inventory, loader, path)
+        self._read_config_data(path)
+
+        try:
+            module = PluginModule(dict(
+                url=self.get_option('url'),
+                foreman_user=self.get_option('foreman_user'),
+                foreman_password=self.get_option('foreman_password'),
+                lookup_cache_dir=self.get_option('cache_dir')))
+        except ModuleExit as e:
+            raise AnsibleParserError(e.result.get('msg'))
+        host_cache = InventoryCache(self.get_option('cache_dir'),
+                                    module.params['url'],
+                                    module.params['foreman_user'])
+        data = None
+        if cache and self.get_option('host_cache'):
+            data = host_cache.load()
+            if data is not None and \
+                    data.get('search') != self.get_option('search'):
+                data = None
+        if data is None:
+            data = dict(hosts={}, search=self.get_option('search'))
+
+        try:
+            self._sync(module, get_foreman_client(module), data)
+        except ModuleExit as e:
+            raise AnsibleParserError(e.result.get('msg'))
+        if self.get_option('host_cache'):
+            host_cache.store(data)
+        self._populate(data['hosts'])
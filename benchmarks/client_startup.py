@@ -0,0 +1,105 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures the cost of building the foreman client used by the modules.
+
+Compares building python-foreman's client directly, as the modules did
+before the api cache, with building it through foreman_utils with a cold
+and a warm api cache:
+
+    python benchmarks/client_startup.py https://mysat.example.com admin pass
+"""
+
+import argparse
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+FOREMAN_UTILS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', 'ansible', 'module_utils', 'foreman_utils')
+PACKAGE = 'ansible.module_utils.foreman_utils'
+
+
+def load_foreman_utils():
+    """Imports the foreman_utils package of this tree, returns its names.
+
+    It's registered under its ansible name so its own imports resolve to
+    this tree, ansible itself isn't needed.
+    """
+    if PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            PACKAGE, os.path.join(FOREMAN_UTILS, '__init__.py'),
+            submodule_search_locations=[FOREMAN_UTILS])
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[PACKAGE] = package
+        spec.loader.exec_module(package)
+    return vars(sys.modules[PACKAGE])
+
+
+class FakeModule(object):
+
+    def __init__(self, **params):
+        self.params = params
+
+
+def _timed(function, runs):
+    times = []
+    for _ in range(runs):
+        start = time.time()
+        function()
+        times.append(time.time() - start)
+    return times
+
+
+def _report(name, times):
+    print('%-12s runs=%-3d min=%.3fs mean=%.3fs max=%.3fs' %
+          (name, len(times), min(times), sum(times) / len(times),
+           max(times)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('url')
+    parser.add_argument('user')
+    parser.add_argument('password')
+    parser.add_argument('-n', '--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    from foreman.client import Foreman
+    utils = load_foreman_utils()
+    cache_dir = tempfile.mkdtemp()
+    module = FakeModule(url=args.url, foreman_user=args.user,
+                        foreman_password=args.password,
+                        lookup_cache_dir=cache_dir, api_cache_ttl=3600)
+    try:
+        _report('uncached', _timed(
+            lambda: Foreman(args.url, (args.user, args.password),
+                            api_version=utils['API_VERSION']), args.runs))
+        _report('cold cache', _timed(
+            lambda: utils['build_foreman_client'](module), 1))
+        _report('warm cache', _timed(
+            lambda: utils['build_foreman_client'](module), args.runs))
+    finally:
+        shutil.rmtree(cache_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,587 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Local stand-in of the foreman v2 api used by the modules.
+
+Serves, from memory, the indexes of hosts, organizations, locations,
+hostgroups, ptables, subnets, compute resources and compute profiles with
+foreman's scoped search subset used by the modules (=, ^, ~, >, < joined
+by and), pagination and thin results, and the host show, create, update,
+destroy, status and power calls. GETs are answered with an ETag, and
+with 304 when it matches If-None-Match. The hosts put in build finish it
+after --build-time seconds. GET /_fake/stats returns the number of
+requests served. Every request can be delayed and failed on purpose:
+
+    python benchmarks/fake_foreman.py --port 3000 --hosts 1000 \\
+        --latency 0.05 --jitter 0.02 --error-rate 0.01
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs, urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, urlparse
+
+# Version announced by the server, python-foreman ships its api definitions
+VERSION = '1.9.2'
+
+# Resources served by the index endpoints and the fields searchable in them
+RESOURCES = ['hosts', 'organizations', 'locations', 'hostgroups', 'ptables',
+             'subnets', 'compute_resources', 'compute_profiles']
+# Other names given to some resources in the urls
+RESOURCE_ALIASES = {'computeresources': 'compute_resources',
+                    'computeprofiles': 'compute_profiles'}
+DEFAULT_PER_PAGE = 20
+
+# Host fields taking their name from the element referenced by their id
+HOST_REFERENCES = [('organization', 'organizations'),
+                   ('location', 'locations'),
+                   ('hostgroup', 'hostgroups'),
+                   ('ptable', 'ptables'),
+                   ('subnet', 'subnets'),
+                   ('compute_resource', 'compute_resources'),
+                   ('compute_profile', 'compute_profiles')]
+
+# Types of the interfaces as given to foreman and as shown by it
+INTERFACE_TYPES = {'nic::managed': 'interface', 'nic::bmc': 'bmc',
+                   'nic::bond': 'bond', 'nic::bridge': 'bridge'}
+
+CONDITION = re.compile(r'(\w+)\s*(\^|>=|<=|>|<|=|~)\s*'
+                       r'(\([^)]*\)|"[^"]*"|[^\s()]+)')
+
+
+def _timestamp(moment=None):
+    return time.strftime('%Y-%m-%d %H:%M:%S UTC', time.gmtime(moment))
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+def parse_search(search):
+    """Returns the (field, operator, value) conditions of search.
+
+    Only the conditions joined by 'and' are supported, as the ones built by
+    foreman_utils, the values of ^ are lists.
+    """
+    conditions = []
+    for field, operator, value in CONDITION.findall(search or ''):
+        if operator == '^':
+            value = [_unquote(item) for item in
+                     value.strip('()').split(',') if item.strip()]
+        else:
+            value = _unquote(value)
+        conditions.append((field, operator, value))
+    return conditions
+
+
+def _matches(element, conditions):
+    for field, operator, value in conditions:
+        current = element.get(field)
+        if current is None:
+            return False
+        if isinstance(current, bool):
+            current = str(current).lower()
+        elif isinstance(current, int) and operator in ('>=', '<=', '>', '<'):
+            value = int(value)
+        else:
+            current = str(current)
+        if operator == '=' and current != value:
+            return False
+        if operator == '^' and current not in value:
+            return False
+        if operator == '~' and value.lower() not in current.lower():
+            return False
+        if operator == '>=' and current < value:
+            return False
+        if operator == '<=' and current > value:
+            return False
+        if operator == '>' and current <= value:
+            return False
+        if operator == '<' and current >= value:
+            return False
+    return True
+
+
+class FakeForeman(object):
+    """Foreman data served by FakeForemanServer.
+
+    Every request waits latency seconds plus up to jitter more, and fails
+    with error_status with probability error_rate. Hosts created in build
+    finish it after build_time seconds, or never if it is None.
+    """
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, error_status=503,
+                 seed=None, build_time=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.build_time = build_time
+        # time when every host in build finishes it, by id
+        self.builds = {}
+        self.elements = dict((resource, {}) for resource in RESOURCES)
+        # ids of the elements of every resource by name
+        self.names = dict((resource, {}) for resource in RESOURCES)
+        self.requests = 0
+        self.calls = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def add(self, resource, **fields):
+        with self._lock:
+            fields['id'] = self._next_id
+            self._next_id += 1
+            fields.setdefault('created_at', _timestamp())
+            fields.setdefault('updated_at', fields['created_at'])
+            self.elements[resource][fields['id']] = fields
+            self.names[resource].setdefault(fields.get('name'),
+                                            set()).add(fields['id'])
+            return fields
+
+    def _candidates(self, resource, conditions):
+        """Elements which may match conditions, found by name if given"""
+        elements = self.elements[resource]
+        for field, operator, value in conditions:
+            if field == 'name' and operator in ('=', '^'):
+                names = value if operator == '^' else [value]
+                ids = set()
+                for name in names:
+                    ids.update(self.names[resource].get(name, ()))
+                return [elements[id] for id in sorted(ids)]
+            if field == 'id' and operator in ('=', '^'):
+                ids = value if operator == '^' else [value]
+                ids = set(int(id) for id in ids if id.isdigit())
+                return [elements[id] for id in sorted(ids) if id in elements]
+        return [elements[id] for id in sorted(elements)]
+
+    def _finish_builds(self):
+        """Takes out of build the hosts whose build_time is over"""
+        now = time.time()
+        for id, finish in list(self.builds.items()):
+            if finish > now:
+                continue
+            del self.builds[id]
+            host = self.elements['hosts'].get(id)
+            if host is not None:
+                host['build'] = False
+                host['installed_at'] = _timestamp(finish)
+                host['updated_at'] = host['installed_at']
+
+    def populate(self, hosts=0, prefix='host'):
+        """Adds an organization, location, hostgroup, ptable, subnet,
+        compute resource and compute profile, and hosts in them"""
+        refs = dict(
+            organization=self.add('organizations', name='org'),
+            location=self.add('locations', name='loc'),
+            hostgroup=self.add('hostgroups', name='hostgroup',
+                               title='hostgroup'),
+            ptable=self.add('ptables', name='ptable'),
+            subnet=self.add('subnets', name='subnet', network='10.0.0.0',
+                            mask='255.0.0.0', cidr=8),
+            compute_resource=self.add('compute_resources', name='compute'),
+            compute_profile=self.add('compute_profiles', name='profile'))
+        for number in range(hosts):
+            host = dict(name='%s%d.example.com' % (prefix, number),
+                        ip='10.%d.%d.%d' % (number >> 16 & 255,
+                                            number >> 8 & 255, number & 255),
+                        mac='52:54:00:%02x:%02x:%02x' % (
+                            number >> 16 & 255, number >> 8 & 255,
+                            number & 255))
+            for field, element in refs.items():
+                host[field + '_id'] = element['id']
+            self.create_host(host)
+        return refs
+
+    def _host_view(self, host):
+        view = dict(host)
+        for field, resource in HOST_REFERENCES:
+            element = self.elements[resource].get(host.get(field + '_id'))
+            view[field + '_name'] = element and element['name']
+        view['hostgroup_title'] = view['hostgroup_name']
+        return view
+
+    def view(self, resource, element, thin=False):
+        if thin:
+            return dict(id=element['id'], name=element['name'])
+        if resource == 'hosts':
+            return self._host_view(element)
+        return dict(element)
+
+    def index(self, resource, search=None, page=1, per_page=None,
+              thin=False):
+        conditions = parse_search(search)
+        with self._lock:
+            if resource == 'hosts' and self.builds:
+                self._finish_builds()
+            total = len(self.elements[resource])
+            elements = [self.view(resource, element) for element in
+                        self._candidates(resource, conditions)]
+        matching = [element for element in elements
+                    if _matches(element, conditions)]
+        per_page = per_page or DEFAULT_PER_PAGE
+        first = (page - 1) * per_page
+        results = [self.view(resource, element, thin) if thin else element
+                   for element in matching[first:first + per_page]]
+        return dict(total=total, subtotal=len(matching), page=page,
+                    per_page=per_page, search=search, results=results)
+
+    def find(self, resource, id):
+        with self._lock:
+            if resource == 'hosts' and self.builds:
+                self._finish_builds()
+            element = self.elements[resource].get(int(id)) \
+                if str(id).isdigit() else None
+            if element is None:
+                ids = self.names[resource].get(id)
+                element = ids and self.elements[resource][min(ids)]
+        return element
+
+    def _apply_interfaces(self, interfaces, attributes):
+        """Returns interfaces with the interfaces_attributes of a create or
+        update applied as foreman does: the ones with an id change that
+        interface, the others are added. The lock must be held."""
+        interfaces = [dict(interface) for interface in interfaces]
+        by_id = dict((interface['id'], interface) for interface in interfaces)
+        for attribute in attributes:
+            attribute = dict(attribute)
+            if 'type' in attribute:
+                attribute['type'] = INTERFACE_TYPES.get(
+                    str(attribute['type']).lower(), attribute['type'])
+            if attribute.get('mac'):
+                attribute['mac'] = str(attribute['mac']).lower()
+            id = attribute.pop('id', None)
+            if id is not None and int(id) in by_id:
+                by_id[int(id)].update(attribute)
+                continue
+            interface = dict(id=self._next_id, type='interface', name=None,
+                             identifier=None, ip=None, mac=None,
+                             subnet_id=None, managed=True, primary=False,
+                             provision=False)
+            self._next_id += 1
+            interface.update(attribute)
+            interfaces.append(interface)
+        return interfaces
+
+    def create_host(self, host):
+        host = dict(host)
+        parameters = host.pop('host_parameters_attributes', None) or []
+        interfaces = host.pop('interfaces_attributes', None) or []
+        if not host.get('name'):
+            return 422, dict(error=dict(message='Name can\'t be blank'))
+        if self.names['hosts'].get(host['name']):
+            return 422, dict(error=dict(
+                message='Name has already been taken'))
+        host['parameters'] = [dict(name=parameter.get('name'),
+                                   value=parameter.get('value'))
+                              for parameter in parameters]
+        with self._lock:
+            host['interfaces'] = self._apply_interfaces([], interfaces)
+        for field in ('ip', 'mac'):
+            host.setdefault(field, None)
+        host['build'] = str(host.get('build', False)).lower() == 'true'
+        host.setdefault('installed_at', None)
+        host['power'] = 'off'
+        host = self.add('hosts', **host)
+        if host['build'] and self.build_time is not None:
+            with self._lock:
+                self.builds[host['id']] = time.time() + self.build_time
+        return 201, self._host_view(host)
+
+    def update_host(self, id, changes):
+        host = self.find('hosts', id)
+        if host is None:
+            return 404, dict(error=dict(message='Host not found'))
+        changes = dict(changes)
+        parameters = changes.pop('host_parameters_attributes', None)
+        interfaces = changes.pop('interfaces_attributes', None)
+        with self._lock:
+            if 'name' in changes:
+                self.names['hosts'][host['name']].discard(host['id'])
+                self.names['hosts'].setdefault(changes['name'],
+                                               set()).add(host['id'])
+            if 'build' in changes:
+                changes['build'] = str(changes['build']).lower() == 'true'
+                if changes['build'] and self.build_time is not None:
+                    self.builds[host['id']] = time.time() + self.build_time
+            host.update(changes)
+            if parameters:
+                current = dict((parameter['name'], parameter)
+                               for parameter in host['parameters'])
+                for parameter in parameters:
+                    current[parameter.get('name')] = dict(
+                        name=parameter.get('name'),
+                        value=parameter.get('value'))
+                host['parameters'] = list(current.values())
+            if interfaces:
+                host['interfaces'] = self._apply_interfaces(
+                    host.get('interfaces') or [], interfaces)
+            host['updated_at'] = _timestamp()
+        return 200, self._host_view(host)
+
+    def destroy_host(self, id):
+        host = self.find('hosts', id)
+        if host is None:
+            return 404, dict(error=dict(message='Host not found'))
+        with self._lock:
+            self.elements['hosts'].pop(host['id'], None)
+            self.names['hosts'][host['name']].discard(host['id'])
+        return 200, self._host_view(host)
+
+    def power(self, id, action):
+        host = self.find('hosts', id)
+        if host is None:
+            return 404, dict(error=dict(message='Host not found'))
+        if action in ('start', 'on', 'reboot', 'soft', 'reset', 'cycle'):
+            host['power'] = 'on'
+        elif action in ('stop', 'off', 'poweroff'):
+            host['power'] = 'off'
+        elif action != 'state':
+            return 422, dict(error=dict(message='Unknown power action'))
+        return 200, dict(id=host['id'], power=host['power'])
+
+    def status(self, id):
+        host = self.find('hosts', id)
+        if host is None:
+            return 404, dict(error=dict(message='Host not found'))
+        return 200, dict(status=0, status_label='No reports',
+                         global_status=0)
+
+    def delay(self):
+        """Waits the latency of a request, returns whether it fails"""
+        with self._lock:
+            wait = self.latency + self.random.random() * self.jitter
+            failed = self.random.random() < self.error_rate
+        if wait > 0:
+            time.sleep(wait)
+        return failed
+
+    def stats(self):
+        with self._lock:
+            return dict(requests=self.requests, calls=dict(self.calls),
+                        hosts=len(self.elements['hosts']))
+
+    def count(self, endpoint):
+        with self._lock:
+            self.requests += 1
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+
+class FakeForemanHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    # answers written at once, small writes wait for delayed acks
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _answer(self, status, data, content_type='application/json'):
+        body = data if content_type != 'application/json' else \
+            json.dumps(data)
+        body = body.encode('utf-8')
+        etag = None
+        if self.command == 'GET' and status == 200 and \
+                not self.path.startswith('/_fake/'):
+            etag = '"%s"' % hashlib.sha1(body).hexdigest()
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        # always read, the connection is kept open for the next request
+        length = int(self.headers.get('Content-Length') or 0)
+        self.body = {}
+        if length:
+            try:
+                body = json.loads(self.rfile.read(length).decode('utf-8'))
+            except ValueError:
+                return
+            if isinstance(body, dict):
+                self.body = body
+
+    def _route(self, method):
+        foreman = self.server.foreman
+        url = urlparse(self.path)
+        query = dict((name, values[-1]) for name, values in
+                     parse_qs(url.query).items())
+        parts = [part for part in url.path.split('/') if part]
+        if parts == ['_fake', 'stats'] and method == 'GET':
+            # not counted, the requests done by the clients under test
+            return 200, foreman.stats()
+        if parts[:1] == ['api']:
+            parts = parts[1:]
+            if parts[:1] == ['v2']:
+                parts = parts[1:]
+        elif method == 'GET' and not parts:
+            foreman.count('GET /')
+            return 200, '<html><body>Version %s</body></html>' % VERSION
+        else:
+            return 404, dict(error=dict(message='Not found'))
+        resource = parts and RESOURCE_ALIASES.get(parts[0], parts[0])
+        endpoint = '%s /api/%s' % (method, '/'.join(
+            ':id' if position == 1 else part
+            for position, part in enumerate([resource] + parts[1:])))
+        foreman.count(endpoint)
+        if foreman.delay():
+            return foreman.error_status, dict(error=dict(
+                message='Injected error'))
+
+        if parts == ['status']:
+            return 200, dict(version=VERSION, api_version=2)
+        if resource not in RESOURCES:
+            return 404, dict(error=dict(message='Not found'))
+        if len(parts) == 1 and method == 'GET':
+            try:
+                page = int(query.get('page') or 1)
+                per_page = int(query.get('per_page') or 0)
+            except ValueError:
+                return 422, dict(error=dict(message='Invalid page'))
+            return 200, foreman.index(resource, query.get('search'), page,
+                                      per_page,
+                                      query.get('thin') in ('true', '1'))
+        if resource != 'hosts':
+            if len(parts) == 2 and method == 'GET':
+                element = foreman.find(resource, parts[1])
+                if element is not None:
+                    return 200, foreman.view(resource, element)
+            return 404, dict(error=dict(message='Not found'))
+        if len(parts) == 1 and method == 'POST':
+            return foreman.create_host(self.body.get('host') or {})
+        if len(parts) == 2:
+            if method == 'GET':
+                host = foreman.find('hosts', parts[1])
+                if host is None:
+                    return 404, dict(error=dict(message='Host not found'))
+                return 200, foreman.view('hosts', host)
+            if method == 'PUT':
+                return foreman.update_host(parts[1],
+                                           self.body.get('host') or {})
+            if method == 'DELETE':
+                return foreman.destroy_host(parts[1])
+        if len(parts) == 3 and parts[2] == 'status' and method == 'GET':
+            return foreman.status(parts[1])
+        if len(parts) == 3 and parts[2] == 'power' and method == 'PUT':
+            action = query.get('power_action') or \
+                self.body.get('power_action')
+            return foreman.power(parts[1], action)
+        return 404, dict(error=dict(message='Not found'))
+
+    def _handle(self, method):
+        self._read_body()
+        status, data = self._route(method)
+        if isinstance(data, dict):
+            self._answer(status, data)
+        else:
+            self._answer(status, data, 'text/html')
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FakeForemanServer(ThreadingMixIn, HTTPServer):
+    """HTTP server of a FakeForeman, run it with start()"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, foreman, host='127.0.0.1', port=0):
+        HTTPServer.__init__(self, (host, port), FakeForemanHandler)
+        self.foreman = foreman
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--hosts', type=int, default=0,
+                        help='number of hosts created at start')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds every request waits')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='maximum random seconds added to latency')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests failed on purpose')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--build-time', type=float,
+                        help='seconds until the hosts created in build '
+                             'finish it')
+    args = parser.parse_args()
+
+    foreman = FakeForeman(args.latency, args.jitter, args.error_rate,
+                          args.error_status, args.seed, args.build_time)
+    foreman.populate(args.hosts)
+    server = FakeForemanServer(foreman, port=args.port)
+    print('Serving a fake foreman %s at %s' % (VERSION, server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
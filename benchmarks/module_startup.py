@@ -0,0 +1,132 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures the startup of the foreman modules.
+
+Starts foreman_host, foreman_host_facts and foreman_host_power in a new
+python process, as ansible does for every task, with the foreman_utils of
+this tree, and reports the time taken to:
+
+- import: load the module without running it
+- bad args: run it with missing arguments, failing before talking to
+  foreman
+
+along with the heavy libraries each one imported. Both are compared with
+starting python and importing ansible's basic and foreman_utils alone.
+ansible must be installed:
+
+    python benchmarks/module_startup.py --runs 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from client_startup import FOREMAN_UTILS, PACKAGE
+
+MODULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'ansible', 'modules', 'extras', 'foreman')
+MODULES = ['foreman_host', 'foreman_host_facts', 'foreman_host_power']
+# Libraries only needed to talk to foreman
+HEAVY_IMPORTS = ['foreman', 'requests', 'retrying', 'multiprocessing.pool']
+
+# Run in every new process: loads foreman_utils from this tree as
+# client_startup.load_foreman_utils does, reports the heavy libraries
+# imported on exit, even when the module exits on its own, and runs the
+# module given, if any, or just imports ansible's basic.
+BOOTSTRAP = '''
+import atexit, importlib.util, json, os, runpy, sys
+def report():
+    sys.stderr.write('\\nHEAVY ' + json.dumps(
+        [name for name in %(heavy)r if name in sys.modules]) + '\\n')
+atexit.register(report)
+spec = importlib.util.spec_from_file_location(
+    %(package)r, os.path.join(%(utils)r, '__init__.py'),
+    submodule_search_locations=[%(utils)r])
+package = importlib.util.module_from_spec(spec)
+sys.modules[%(package)r] = package
+spec.loader.exec_module(package)
+if len(sys.argv) > 1:
+    path, run_name = sys.argv[1], sys.argv[2]
+    sys.argv = [path] + sys.argv[3:]
+    runpy.run_path(path, run_name=run_name)
+else:
+    import ansible.module_utils.basic
+''' % dict(heavy=HEAVY_IMPORTS, package=PACKAGE,
+           utils=os.path.abspath(FOREMAN_UTILS))
+
+
+def _run(args):
+    """Runs python with args, returns its time and heavy imports"""
+    start = time.time()
+    process = subprocess.Popen([sys.executable] + args,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, err = process.communicate()
+    elapsed = time.time() - start
+    heavy = None
+    for line in err.decode('utf-8', 'replace').splitlines():
+        if line.startswith('HEAVY '):
+            heavy = json.loads(line[len('HEAVY '):])
+    if heavy is None:
+        raise RuntimeError('%s failed: %s' % (' '.join(args),
+                                              err.decode('utf-8', 'replace')))
+    return elapsed, heavy
+
+
+def _measure(args, runs):
+    times = []
+    heavy = []
+    for _ in range(runs):
+        elapsed, heavy = _run(args)
+        times.append(elapsed)
+    return times, heavy
+
+
+def _report(name, times, heavy):
+    print('%-32s runs=%-3d min=%.3fs mean=%.3fs max=%.3fs imports=%s' %
+          (name, len(times), min(times), sum(times) / len(times),
+           max(times), ','.join(heavy) or '-'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--runs', type=int, default=10)
+    parser.add_argument('--modules', default=','.join(MODULES))
+    args = parser.parse_args()
+
+    fd, args_path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as args_file:
+        json.dump(dict(ANSIBLE_MODULE_ARGS={}), args_file)
+    try:
+        _report('module_utils', *_measure(['-c', BOOTSTRAP], args.runs))
+        for name in args.modules.split(','):
+            path = os.path.join(MODULES_DIR, name + '.py')
+            _report(name + ' import', *_measure(
+                ['-c', BOOTSTRAP, path, 'benchmark'], args.runs))
+            _report(name + ' bad args', *_measure(
+                ['-c', BOOTSTRAP, path, '__main__', args_path], args.runs))
+    finally:
+        os.unlink(args_path)
+
+
+if __name__ == '__main__':
+    main()
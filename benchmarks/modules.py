@@ -0,0 +1,288 @@
+#!/usr/bin/python
+# coding: utf-8 -*-
+
+# Copyright (c) 2016 Red Hat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measures the modules against a local fake foreman.
+
+Runs the work of foreman_host (create, update and delete), foreman_host_facts
+and
+foreman_host_power for every host, as one task per host sharing the client
+like the action plugins do, against benchmarks/fake_foreman.py run in
+another process. Reports the round trips, wall time and peak memory of
+every scenario, which can be saved and compared with a previous run:
+
+    python benchmarks/modules.py --sizes 1,100,10000 --json run.json
+    python benchmarks/modules.py --sizes 1,100,10000 --baseline run.json
+
+Comparing with a baseline fails when a scenario needs more round trips, or
+takes longer or more memory than allowed by --tolerance.
+"""
+
+import argparse
+import json
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing.pool import ThreadPool
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from client_startup import load_foreman_utils
+from fake_foreman import FakeForeman, FakeForemanServer
+
+SCENARIOS = ['create', 'update', 'facts', 'power', 'delete']
+
+# Interfaces set by the update scenario, the bmc is only known by its
+# identifier
+INTERFACES = ("[{'mac': '10:00:00:00:00:00', 'ip': '10.0.1.1', "
+              "'type': 'Nic::Managed'}, {'identifier': 'ipmi', "
+              "'ip': '10.0.2.1', 'type': 'Nic::BMC', 'provider': 'IPMI'}]")
+
+
+def _serve(options, queue):
+    foreman = FakeForeman(options['latency'], options['jitter'],
+                          options['error_rate'], options['error_status'],
+                          options['seed'])
+    foreman.populate()
+    server = FakeForemanServer(foreman)
+    queue.put(server.url)
+    server.serve_forever()
+
+
+def start_server(options):
+    """Runs a fake foreman in another process, returns it and its url"""
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_serve, args=(options, queue))
+    process.daemon = True
+    process.start()
+    return process, queue.get(timeout=30)
+
+
+def server_requests(client, url):
+    """Number of requests served by the fake foreman so far"""
+    return client.session.get(url + '/_fake/stats').json()['requests']
+
+
+def _create(utils, module, foreman_client):
+    utils['ensure_host'](module, foreman_client)
+
+
+def _update(utils, module, foreman_client):
+    # the same update is run twice, the second one must find the host up
+    # to date
+    try:
+        utils['ensure_host'](module, foreman_client)
+    except utils['ModuleExit'] as e:
+        if e.result.get('failed'):
+            raise
+    try:
+        utils['ensure_host'](module, foreman_client)
+    except utils['ModuleExit'] as e:
+        if e.result.get('changed'):
+            module.fail_json(msg='%s changed by the same update' %
+                             module.params['name'])
+        raise
+
+
+def _facts(utils, module, foreman_client):
+    utils['exit_host_facts'](module, foreman_client)
+
+
+def _power(utils, module, foreman_client):
+    utils['apply_power_action'](module, foreman_client)
+
+
+def _delete(utils, module, foreman_client):
+    utils['ensure_host'](module, foreman_client)
+
+
+def _tasks(utils, scenario, names, common):
+    """Returns the function, params and argument spec of every task"""
+    if scenario in ('create', 'update', 'delete'):
+        spec = utils['host_argument_spec']()
+        state = 'absent' if scenario == 'delete' else 'present'
+        params = [dict(common, name=name, state=state, organization_name='org',
+                       location_name='loc', hostgroup_name='hostgroup',
+                       ptable_name='ptable', mac='52:54:00:%02x:%02x:%02x' % (
+                           number >> 16 & 255, number >> 8 & 255,
+                           number & 255))
+                  for number, name in enumerate(names)]
+        if scenario == 'update':
+            for task_params in params:
+                task_params.update(update=True,
+                                   interfaces_attributes=INTERFACES)
+        function = dict(create=_create, update=_update,
+                        delete=_delete)[scenario]
+    elif scenario == 'facts':
+        spec = utils['host_facts_argument_spec']()
+        params = [dict(common, name=name) for name in names]
+        function = _facts
+    else:
+        spec = utils['host_power_argument_spec']()
+        params = [dict(common, name=name, power_action='on')
+                  for name in names]
+        function = _power
+    return function, params, spec
+
+
+def _run_task(task):
+    utils, function, params, spec = task
+    try:
+        module = utils['PluginModule'](params, spec)
+        function(utils, module,
+                 utils['get_foreman_client'](module, shared=True))
+    except utils['ModuleExit'] as e:
+        return not e.result.get('failed')
+    except Exception:
+        return False
+    return True
+
+
+def run_scenario(utils, scenario, names, common, workers, client, url,
+                 memory):
+    function, params, spec = _tasks(utils, scenario, names, common)
+    tasks = [(utils, function, task_params, spec) for task_params in params]
+    served = server_requests(client, url)
+    if memory:
+        tracemalloc.start()
+    start = time.time()
+    if workers > 1:
+        pool = ThreadPool(workers)
+        try:
+            results = pool.map(_run_task, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_run_task(task) for task in tasks]
+    wall = time.time() - start
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    round_trips = server_requests(client, url) - served
+    return dict(scenario=scenario, hosts=len(names), round_trips=round_trips,
+                wall=wall, memory=peak,
+                failed=len([result for result in results if not result]))
+
+
+def _report(result):
+    hosts = result['hosts']
+    memory = '-' if result['memory'] is None else \
+        '%.1fMB' % (result['memory'] / 1024.0 / 1024.0)
+    print('%-7s hosts=%-6d round_trips=%-7d (%.1f/host) wall=%.2fs '
+          '(%.2fms/host) memory=%s failed=%d' %
+          (result['scenario'], hosts, result['round_trips'],
+           float(result['round_trips']) / hosts, result['wall'],
+           result['wall'] * 1000 / hosts, memory, result['failed']))
+
+
+def compare(results, baseline, tolerance):
+    """Returns the regressions of results from the baseline ones"""
+    previous = dict(((result['scenario'], result['hosts']), result)
+                    for result in baseline)
+    regressions = []
+    for result in results:
+        before = previous.get((result['scenario'], result['hosts']))
+        if before is None:
+            continue
+        name = '%s/%d' % (result['scenario'], result['hosts'])
+        if result['round_trips'] > before['round_trips']:
+            regressions.append('%s: %d round trips, %d before' %
+                               (name, result['round_trips'],
+                                before['round_trips']))
+        if result['wall'] > before['wall'] * tolerance:
+            regressions.append('%s: %.2fs wall time, %.2fs before' %
+                               (name, result['wall'], before['wall']))
+        if result['memory'] and before.get('memory') and \
+                result['memory'] > before['memory'] * tolerance:
+            regressions.append('%s: %d bytes, %d before' %
+                               (name, result['memory'], before['memory']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1,100,10000',
+                        help='comma separated numbers of hosts')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--workers', type=int, default=8,
+                        help='tasks run concurrently, as ansible forks')
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-memory', action='store_true',
+                        help="don't trace the memory, it slows the tasks")
+    parser.add_argument('--json', help='file where the results are saved')
+    parser.add_argument('--baseline',
+                        help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help='allowed ratio of wall time and memory over '
+                             'the baseline')
+    args = parser.parse_args()
+
+    utils = load_foreman_utils()
+    process, url = start_server(dict(latency=args.latency,
+                                     jitter=args.jitter,
+                                     error_rate=args.error_rate,
+                                     error_status=args.error_status,
+                                     seed=args.seed))
+    cache_dir = tempfile.mkdtemp()
+    common = dict(url=url, foreman_user='admin', foreman_password='pass',
+                  lookup_cache_dir=cache_dir, pool_size=args.workers)
+    memory = tracemalloc is not None and not args.no_memory
+    results = []
+    try:
+        # the client is built before measuring, as the action plugins
+        # build it once per process
+        module = utils['PluginModule'](common)
+        client = utils['get_foreman_client'](module, shared=True)
+        client.client
+        for size in [int(size) for size in args.sizes.split(',')]:
+            names = ['bench%d-%d.example.com' % (size, number)
+                     for number in range(size)]
+            for scenario in args.scenarios.split(','):
+                result = run_scenario(utils, scenario, names, common,
+                                      args.workers, client, url, memory)
+                _report(result)
+                results.append(result)
+    finally:
+        shutil.rmtree(cache_dir)
+        process.terminate()
+
+    if args.json:
+        with open(args.json, 'w') as results_file:
+            json.dump(results, results_file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file),
+                                  args.tolerance)
+        for regression in regressions:
+            print('REGRESSION %s' % regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()